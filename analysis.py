@@ -0,0 +1,125 @@
+from typing import Dict, Tuple
+
+import numpy as np
+from PIL import Image
+
+from lookup_table import LookupTable, MipmapLookupTable
+from mipmap import atlas_layout, level_sizes
+from projections.base import Projection
+
+# Bulk quality checks of projections and conversions, for QA and CI
+
+# Directions closer than this (in radians) are considered the same
+EQUIVALENT_ANGLE = 1e-6
+
+
+def round_trip_error(
+    projection: Projection,
+    width: int,
+    height: int,
+    rows_per_chunk: int = 256,
+) -> np.ndarray:
+    # Distance in pixels between each pixel of a width x height image and
+    # to_points(to_directions(pixel)), of shape (height, width). Pixels
+    # without a direction (projection gaps) or whose direction is rejected
+    # are NaN. Directions along cube edges, at the poles or on the azimuth
+    # seam have several equivalent pixels, so a round trip ending on another
+    # pixel with the same direction counts as exact.
+    # Computed in chunks of rows to bound memory use.
+    errors = np.full((height, width), np.nan, dtype=np.float32)
+    xs = np.arange(width) / width
+    for y_start in range(0, height, rows_per_chunk):
+        ys = np.arange(y_start, min(y_start + rows_per_chunk, height)) / height
+        grid_xs, grid_ys = np.meshgrid(xs, ys)
+        vectors, valid = projection.to_directions(grid_xs, grid_ys)
+        round_trip_xs, round_trip_ys, round_trip_valid = projection.to_points(vectors)
+        round_trip_vectors, _ = projection.to_directions(round_trip_xs, round_trip_ys)
+
+        error = np.hypot((round_trip_xs - grid_xs) * width, (round_trip_ys - grid_ys) * height)
+        # Directions of some projections (e.g. cube maps) are not unit
+        # vectors. Gaps have zero vectors and are NaN anyway.
+        with np.errstate(divide='ignore', invalid='ignore'):
+            cosines = np.einsum('...i,...i->...', vectors, round_trip_vectors) / (
+                np.linalg.norm(vectors, axis=-1) * np.linalg.norm(round_trip_vectors, axis=-1)
+            )
+        equivalent = cosines > np.cos(EQUIVALENT_ANGLE)
+        error = np.where(equivalent, 0.0, error)
+        errors[y_start:y_start + len(ys)] = np.where(valid & round_trip_valid, error, np.nan)
+    return errors
+
+
+def source_density(lookup_table: LookupTable) -> np.ndarray:
+    # How much each input pixel contributes to the output, of shape
+    # (in_height, in_width): The sum of its weights over all output pixels.
+    # Zero marks input regions which are not covered by the conversion,
+    # values above one input regions which are oversampled.
+    # The weights of an output pixel add up to one, so the density counts
+    # the output pixels drawing from an input pixel
+    in_width, in_height = lookup_table.input_size
+    density = np.zeros(in_width * in_height)
+    for _, indices, weights in lookup_table.tap_groups():
+        density += np.bincount(
+            indices.ravel(),
+            weights=None if weights is None else weights.ravel(),
+            minlength=in_width * in_height,
+        )
+    density = density.reshape(in_height, in_width)
+    if isinstance(lookup_table, MipmapLookupTable):
+        density = _input_density(density, lookup_table)
+    return density.astype(np.float32)
+
+
+def _input_density(atlas_density: np.ndarray, lookup_table: MipmapLookupTable) -> np.ndarray:
+    # Density of the input pixels, from the density of the pyramid atlas:
+    # A pixel of level l spreads its weight over the 2^l x 2^l input pixels
+    # it averages
+    in_width, in_height = lookup_table.base_size
+    offsets, _ = atlas_layout(in_width, in_height, lookup_table.levels, lookup_table.first_level)
+    sizes = level_sizes(in_width, in_height, lookup_table.levels)[lookup_table.first_level:]
+    density = np.zeros((in_height, in_width))
+    for level, ((x, y), (width, height)) in enumerate(zip(offsets, sizes), lookup_table.first_level):
+        scale = 2 ** level
+        level_density = atlas_density[y:y + height, x:x + width] / (scale * scale)
+        spread = np.repeat(np.repeat(level_density, scale, axis=0), scale, axis=1)
+        # Rows and columns beyond the input were padded: Repeated edges,
+        # or the first columns of horizontally wrapping inputs
+        spread[in_height - 1] += spread[in_height:].sum(axis=0)
+        spread = spread[:in_height]
+        for column_start in range(in_width, spread.shape[1], in_width):
+            extra = spread[:, column_start:column_start + in_width]
+            if lookup_table.wrap_x:
+                spread[:, :extra.shape[1]] += extra
+            else:
+                spread[:, in_width - 1] += extra.sum(axis=1)
+        density += spread[:, :in_width]
+    return density
+
+
+def summary(values: np.ndarray) -> Dict[str, float]:
+    # Statistics of a map, ignoring NaN pixels
+    finite = values[np.isfinite(values)]
+    if not len(finite):
+        return {'valid_fraction': 0.0}
+    return {
+        'valid_fraction': len(finite) / values.size,
+        'min': float(finite.min()),
+        'mean': float(finite.mean()),
+        'max': float(finite.max()),
+        'nonzero_fraction': float(np.count_nonzero(finite)) / values.size,
+    }
+
+
+def save_map(path: str, values: np.ndarray, value_range: Tuple[float, float] = None):
+    # Raw float32 array for .npy paths. Otherwise a grayscale image scaling
+    # value_range (default: the finite values' range) to black..white,
+    # with NaN pixels black.
+    if path.endswith('.npy'):
+        np.save(path, values.astype(np.float32))
+        return
+    if value_range is None:
+        finite = values[np.isfinite(values)]
+        value_range = (float(finite.min()), float(finite.max())) if len(finite) else (0.0, 1.0)
+    low, high = value_range
+    scaled = (values - low) / ((high - low) or 1.0)
+    scaled = np.clip(np.nan_to_num(scaled, nan=0.0), 0.0, 1.0)
+    Image.fromarray(np.rint(scaled * 255).astype(np.uint8)).save(path)
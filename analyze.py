@@ -0,0 +1,54 @@
+import argparse
+import json
+from analysis import round_trip_error, save_map, source_density, summary
+from filters import FILTERS, SUPERSAMPLING_KERNELS
+from projector import Projector
+
+from projections.map import projections_map
+
+
+parser = argparse.ArgumentParser(description='Quality checks of projections and conversions. Prints statistics as JSON.')
+subparsers = parser.add_subparsers(dest='analysis', required=True)
+
+round_trip_parser = subparsers.add_parser('round-trip', help='Pixel error of mapping each pixel to a direction and back')
+round_trip_parser.add_argument('--projection', type=str, required=True, help=f'One of {", ".join(projections_map)}')
+round_trip_parser.add_argument('--width', type=int, required=True, help='Image width, in pixels')
+round_trip_parser.add_argument('--height', type=int, help='Image height, in pixels. Derived from the aspect ratio of the projection by default.')
+
+coverage_parser = subparsers.add_parser('coverage', help='Density of the input pixels sampled by a conversion')
+coverage_parser.add_argument('--in-projection', type=str, required=True, help=f'Input image projection. One of {", ".join(projections_map)}')
+coverage_parser.add_argument('--out-projection', type=str, required=True, help=f'Output image projection. One of {", ".join(projections_map)}')
+coverage_parser.add_argument('--in-width', type=int, required=True, help='Width of input image, in pixels')
+coverage_parser.add_argument('--in-height', type=int, required=True, help='Height of input image, in pixels')
+coverage_parser.add_argument('--width', type=int, help='Width of output image, in pixels')
+coverage_parser.add_argument('--height', type=int, help='Height of output image, in pixels')
+coverage_parser.add_argument('--rotation', type=str, help='Rotate by given angles (<x>,<y>,<z> in degrees)')
+coverage_parser.add_argument('--rotation-quaternion', type=str, help='Rotate by given unit quaternion (<w>,<x>,<y>,<z>), after --rotation')
+coverage_parser.add_argument('--samples', type=int, default=1, help='Take NxN samples per pixel')
+coverage_parser.add_argument('--sample-kernel', type=str, default='box', choices=SUPERSAMPLING_KERNELS, help='Weighting of the NxN samples per pixel')
+sampling_group = coverage_parser.add_mutually_exclusive_group()
+sampling_group.add_argument('--adaptive-samples', action='store_true', help='Vary the samples per pixel with the local distortion, up to --samples x --samples where the input is compressed most')
+sampling_group.add_argument('--mipmap', action='store_true', help='Sample a mip pyramid of the input, on the level matching the footprint of each pixel, so that downscaling costs a constant number of taps per pixel. --samples then takes N samples along the more compressed axis only.')
+coverage_parser.add_argument('--filter', type=str, default='nearest', choices=FILTERS, help='Filter used when sampling the input image')
+
+for subparser in (round_trip_parser, coverage_parser):
+    subparser.add_argument('--hemi-fov-x', type=int, default=180, help='Horizontal field of view (in degrees) of hemispherical projection')
+    subparser.add_argument('--hemi-fov-y', type=int, default=180, help='Vertical field of view (in degrees) of hemispherical projection')
+    subparser.add_argument('--out', type=str, help='Write the map to this file: .npy for raw float32 values, else a grayscale image')
+
+args = parser.parse_args()
+
+if args.analysis == 'round-trip':
+    projection = projections_map[args.projection](hemi_fov_x=args.hemi_fov_x, hemi_fov_y=args.hemi_fov_y)
+    height = args.height or int(args.width / projection.aspect_ratio())
+    values = round_trip_error(projection, args.width, height)
+    # Errors of a pixel and more are all white
+    value_range = (0.0, 1.0)
+else:
+    projector = Projector.from_cli_args(args, (args.in_width, args.in_height))
+    values = source_density(projector.lookup_table)
+    value_range = None
+
+if args.out:
+    save_map(args.out, values, value_range)
+print(json.dumps(summary(values), indent=2))
@@ -0,0 +1,138 @@
+import os
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from multiprocessing import Pool, shared_memory
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import profiling
+from image_io import read_image, write_image
+from lookup_table import LookupTable, load_lookup_table
+
+# Lookup table shared by all worker processes, attached in _init_worker
+_worker_lookup_table: Optional[LookupTable] = None
+_worker_shared_memory: List[shared_memory.SharedMemory] = []
+
+
+def decode_image(input_path: str) -> np.ndarray:
+    # Image file as array of shape (height, width, channels)
+    with profiling.stage('decode', path=input_path):
+        input_image_buffer = read_image(input_path)
+    if profiling.enabled:
+        profiling.count('bytes_read', os.path.getsize(input_path))
+
+    if input_image_buffer.ndim == 2:
+        input_image_buffer = np.expand_dims(input_image_buffer, 2)
+    return input_image_buffer
+
+
+def remap_image(input_image_buffer: np.ndarray, lookup_table: LookupTable) -> np.ndarray:
+    # Output of the same dtype and channels as the input
+    return lookup_table.apply(input_image_buffer)
+
+
+def encode_image(output_image_buffer: np.ndarray, output_path: str):
+    with profiling.stage('encode', path=output_path):
+        write_image(output_path, output_image_buffer)
+    if profiling.enabled:
+        profiling.count('bytes_written', os.path.getsize(output_path))
+
+
+def render_image(input_path: str, output_path: str, lookup_table: LookupTable):
+    # Decode, remap and encode a single image
+    encode_image(remap_image(decode_image(input_path), lookup_table), output_path)
+
+
+def _init_worker(array_specs: Dict[str, Tuple[str, Tuple[int, ...], str]]):
+    global _worker_lookup_table
+    # Forked workers inherit the events recorded so far, which are not theirs
+    profiling.take_events()
+    arrays = {}
+    for name, (shared_memory_name, shape, dtype) in array_specs.items():
+        memory = shared_memory.SharedMemory(name=shared_memory_name)
+        _worker_shared_memory.append(memory)
+        arrays[name] = np.ndarray(shape, dtype=dtype, buffer=memory.buf)
+        arrays[name].flags.writeable = False
+    _worker_lookup_table = load_lookup_table(arrays)
+
+
+def _render_job(job: Tuple[str, str]):
+    input_path, output_path = job
+    render_image(input_path, output_path, _worker_lookup_table)
+    # Profiling data is passed to the main process, which writes the trace
+    return profiling.take_events() if profiling.enabled else None
+
+
+def _render_pipelined(
+    jobs: List[Tuple[str, str]],
+    lookup_table: LookupTable,
+    prefetch: int,
+    writers: int,
+    write_queue_depth: int,
+):
+    # Decode up to prefetch images ahead in background threads, remap in
+    # the calling thread, and encode and save in a pool of writer threads,
+    # with at most write_queue_depth images waiting to be written. Memory
+    # stays at prefetch input and write_queue_depth output images, while
+    # file latency overlaps with computation.
+    with ThreadPoolExecutor(prefetch, thread_name_prefix='decode') as readers, \
+            ThreadPoolExecutor(writers, thread_name_prefix='encode') as writer_pool:
+        decoded = deque(readers.submit(decode_image, input_path) for input_path, _ in jobs[:prefetch])
+        written = deque()
+        for job_index, (_, output_path) in enumerate(jobs):
+            input_image_buffer = decoded.popleft().result()
+            if job_index + prefetch < len(jobs):
+                decoded.append(readers.submit(decode_image, jobs[job_index + prefetch][0]))
+
+            output_image_buffer = remap_image(input_image_buffer, lookup_table)
+            del input_image_buffer
+            written.append(writer_pool.submit(encode_image, output_image_buffer, output_path))
+            while len(written) > write_queue_depth:
+                written.popleft().result()
+                yield
+        while written:
+            written.popleft().result()
+            yield
+
+
+def render_images(
+    jobs: List[Tuple[str, str]],
+    lookup_table: LookupTable,
+    workers: int = 1,
+    prefetch: int = 0,
+    writers: int = 1,
+    write_queue_depth: int = 2,
+):
+    # Render (input path, output path) jobs, yielding once per finished job,
+    # in job order. With multiple workers, the lookup table is placed in
+    # shared memory once and mapped read-only by every worker process.
+    # In a single process, prefetch > 0 overlaps decoding, remapping and
+    # encoding, see _render_pipelined.
+    if workers <= 1:
+        if prefetch > 0:
+            yield from _render_pipelined(jobs, lookup_table, prefetch, max(writers, 1), max(write_queue_depth, 1))
+            return
+        for input_path, output_path in jobs:
+            render_image(input_path, output_path, lookup_table)
+            yield
+        return
+
+    table_memory = []
+    try:
+        array_specs = {}
+        for name, array in lookup_table.arrays().items():
+            memory = shared_memory.SharedMemory(create=True, size=max(array.nbytes, 1))
+            table_memory.append(memory)
+            np.ndarray(array.shape, dtype=array.dtype, buffer=memory.buf)[...] = array
+            array_specs[name] = (memory.name, array.shape, array.dtype.str)
+
+        with Pool(workers, initializer=_init_worker, initargs=(array_specs,)) as pool:
+            for profile in pool.imap(_render_job, jobs):
+                if profile is not None:
+                    profiling.merge_events(*profile)
+                yield
+    finally:
+        for memory in table_memory:
+            memory.close()
+            memory.unlink()
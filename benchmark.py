@@ -0,0 +1,196 @@
+import argparse
+import itertools
+import json
+import os
+import platform
+import resource
+import sys
+import tempfile
+import time
+from multiprocessing import Pool
+
+import numpy as np
+from PIL import Image
+
+from batch import render_images
+from projections.map import projections_map
+from projections.utils import Rotation
+from projector import Projector
+
+ROTATION = Rotation.from_angles(10, 20, 30)
+
+
+def _synthetic_input(in_projection: str, width: int) -> np.ndarray:
+    # Noise image with the ideal aspect ratio of the input projection
+    height = int(width / projections_map[in_projection].aspect_ratio())
+    return np.random.default_rng(0).integers(0, 256, (height, width, 3), dtype=np.uint8)
+
+
+def _peak_rss_megabytes() -> float:
+    # ru_maxrss is in kilobytes on Linux, in bytes on macOS
+    peak_rss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak_rss / (1024 * 1024) if sys.platform == 'darwin' else peak_rss / 1024
+
+
+def _best_time(function, repeat: int) -> float:
+    # Fastest of several runs, in seconds
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        function()
+        timings.append(time.perf_counter() - start)
+    return min(timings)
+
+
+def run_case(case: dict, repeat: int = 3) -> dict:
+    # Runs in a fresh worker process, so peak RSS is per case
+    out_width = case['width']
+    out_height = int(out_width / projections_map[case['out_projection']].aspect_ratio())
+    input_buffer = _synthetic_input(case['in_projection'], out_width)
+    in_height, in_width = input_buffer.shape[:2]
+
+    def compile_projector() -> Projector:
+        return Projector(
+            case['out_projection'],
+            (in_width, in_height),
+            in_projection=case['in_projection'],
+            out_width=out_width,
+            out_height=out_height,
+            rotation=ROTATION if case['rotation'] else None,
+            samples=case['samples'],
+        ).compile()
+
+    projector = compile_projector()
+    table_build_seconds = _best_time(compile_projector, repeat)
+
+    images = case['images']
+    with tempfile.TemporaryDirectory() as directory:
+        if images:
+            # Batch mode, including decode and encode like project_many.py
+            jobs = []
+            for image_index in range(images):
+                input_path = os.path.join(directory, f'in_{image_index:04d}.jpg')
+                Image.fromarray(input_buffer).save(input_path, quality=90)
+                jobs.append((input_path, os.path.join(directory, f'frame_{image_index:04d}.jpg')))
+            render_seconds = _best_time(lambda: list(render_images(jobs, projector.lookup_table)), repeat)
+        else:
+            # Single in-memory image, like project.py without encoding
+            render_seconds = _best_time(lambda: projector.project(input_buffer), repeat)
+
+    megapixels = out_width * out_height * max(images, 1) / 1e6
+    return dict(
+        case,
+        name=case_name(case),
+        out_size=[out_width, out_height],
+        table_build_seconds=table_build_seconds,
+        render_seconds=render_seconds,
+        megapixels_per_second=megapixels / render_seconds,
+        peak_rss_megabytes=_peak_rss_megabytes(),
+    )
+
+
+def case_name(case: dict) -> str:
+    return (
+        f"{case['in_projection']}->{case['out_projection']} {case['width']}px"
+        f" rotation={'on' if case['rotation'] else 'off'}"
+        f" samples={case['samples']} images={case['images']}"
+    )
+
+
+def build_cases(sizes, sample_counts, image_counts):
+    # Single-image cases cover every projection pair, size, rotation and
+    # sample count. Batch cases cover every pair and size with N images.
+    pairs = list(itertools.product(projections_map, projections_map))
+    cases = []
+    for (in_projection, out_projection), width, rotation, samples in itertools.product(
+        pairs, sizes, (False, True), sample_counts
+    ):
+        cases.append(dict(
+            in_projection=in_projection,
+            out_projection=out_projection,
+            width=width,
+            rotation=rotation,
+            samples=samples,
+            images=0,
+        ))
+    for (in_projection, out_projection), width, images in itertools.product(pairs, sizes, image_counts):
+        cases.append(dict(
+            in_projection=in_projection,
+            out_projection=out_projection,
+            width=width,
+            rotation=True,
+            samples=1,
+            images=images,
+        ))
+    return cases
+
+
+def compare(results, baseline, threshold: float):
+    # Cases which got slower than the baseline by more than threshold (relative)
+    baseline_by_name = {result['name']: result for result in baseline['results']}
+    regressions = []
+    for result in results:
+        reference = baseline_by_name.get(result['name'])
+        if not reference:
+            continue
+        for metric, higher_is_better in (('megapixels_per_second', True), ('table_build_seconds', False)):
+            change = result[metric] / reference[metric] - 1.0
+            if (-change if higher_is_better else change) > threshold:
+                regressions.append(dict(
+                    name=result['name'],
+                    metric=metric,
+                    baseline=reference[metric],
+                    current=result[metric],
+                    change=change,
+                ))
+    return regressions
+
+
+def parse_int_list(value: str):
+    return [int(item) for item in value.split(',')]
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--sizes', type=parse_int_list, default=[256, 1024], help='Output widths, comma-separated')
+    parser.add_argument('--samples', type=parse_int_list, default=[1, 2, 4], help='Sample counts (NxN per pixel), comma-separated')
+    parser.add_argument('--images', type=parse_int_list, default=[1, 8], help='Image counts for batch mode cases, comma-separated')
+    parser.add_argument('--repeat', type=int, default=3, help='Report the fastest of this many runs per case')
+    parser.add_argument('--filter', type=str, help='Only run cases whose name contains this string')
+    parser.add_argument('--out', type=str, help='Write results as JSON to this file instead of stdout')
+    parser.add_argument('--compare', type=str, help='Baseline JSON file to compare results against')
+    parser.add_argument('--threshold', type=float, default=0.1, help='Relative slowdown reported as regression')
+    args = parser.parse_args()
+
+    cases = build_cases(args.sizes, args.samples, args.images)
+    if args.filter:
+        cases = [case for case in cases if args.filter in case_name(case)]
+
+    results = []
+    for case_index, case in enumerate(cases):
+        print(f"Case {case_index+1}/{len(cases)}: {case_name(case)}", file=sys.stderr)
+        with Pool(1) as pool:
+            results.append(pool.apply(run_case, (case, args.repeat)))
+
+    report = dict(
+        python=platform.python_version(),
+        numpy=np.__version__,
+        machine=platform.machine(),
+        cpu_count=os.cpu_count(),
+        results=results,
+    )
+
+    exit_code = 0
+    if args.compare:
+        with open(args.compare) as f:
+            report['regressions'] = compare(results, json.load(f), args.threshold)
+        for regression in report['regressions']:
+            print(f"Regression: {regression['name']} {regression['metric']} {regression['change']:+.0%}", file=sys.stderr)
+        exit_code = 1 if report['regressions'] else 0
+
+    if args.out:
+        with open(args.out, 'w') as f:
+            json.dump(report, f, indent=2)
+    else:
+        json.dump(report, sys.stdout, indent=2)
+    sys.exit(exit_code)
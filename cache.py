@@ -0,0 +1,122 @@
+import hashlib
+import json
+import os
+from typing import Dict, Optional
+
+import numpy as np
+
+import profiling
+
+# Bump when the layout of cached lookup tables changes
+CACHE_FORMAT_VERSION = 5
+
+
+class LookupTableCache:
+    """
+    On-disk cache for projection lookup tables.
+
+    Each table is a set of .npy arrays, named after a hash of the projection
+    parameters, plus a JSON manifest which is written last. Arrays are
+    memory-mapped when loaded. The cache directory is kept below max_size
+    bytes by evicting the least recently used tables.
+    """
+
+    def __init__(self, directory: str, max_size: int):
+        self.directory = directory
+        self.max_size = max_size
+        os.makedirs(self.directory, exist_ok=True)
+
+    @staticmethod
+    def key(settings, rotation, **options) -> str:
+        # Options are further parameters affecting the table, like the filter
+        parameters = {
+            'version': CACHE_FORMAT_VERSION,
+            'in_projection': settings.in_projection_name,
+            'out_projection': settings.out_projection_name,
+            'in_size': [settings.in_width, settings.in_height],
+            'out_size': [settings.out_width, settings.out_height],
+            'rotation': rotation.matrix.round(12).tolist() if rotation else None,
+            'hemi_fov': [settings.hemi_fov_x, settings.hemi_fov_y],
+            'options': options,
+        }
+        serialized = json.dumps(parameters, sort_keys=True)
+        return hashlib.sha1(serialized.encode('utf-8')).hexdigest()
+
+    def _manifest_path(self, key: str) -> str:
+        return os.path.join(self.directory, f'{key}.json')
+
+    def _array_path(self, key: str, name: str) -> str:
+        return os.path.join(self.directory, f'{key}.{name}.npy')
+
+    def load(self, key: str) -> Optional[Dict[str, np.ndarray]]:
+        manifest_path = self._manifest_path(key)
+        try:
+            with profiling.stage('cache_load', key=key):
+                with open(manifest_path) as f:
+                    names = json.load(f)
+                arrays = {
+                    name: np.load(self._array_path(key, name), mmap_mode='r')
+                    for name in names
+                }
+        except (OSError, ValueError):
+            # Missing or unreadable (e.g. partially evicted) table
+            return None
+        # Mark as recently used. The table may have been evicted by another
+        # process since, but the arrays are mapped already.
+        try:
+            os.utime(manifest_path)
+        except OSError:
+            pass
+        return arrays
+
+    def store(self, key: str, arrays: Dict[str, np.ndarray]):
+        # Write to temporary files first so concurrent readers
+        # never see a partially written table
+        with profiling.stage('cache_store', key=key):
+            for name, array in arrays.items():
+                path = self._array_path(key, name)
+                temporary_path = f'{path}.{os.getpid()}.tmp'
+                with open(temporary_path, 'wb') as f:
+                    np.save(f, array)
+                os.replace(temporary_path, path)
+                profiling.count('bytes_written', array.nbytes)
+
+        manifest_path = self._manifest_path(key)
+        temporary_path = f'{manifest_path}.{os.getpid()}.tmp'
+        with open(temporary_path, 'w') as f:
+            json.dump(sorted(arrays), f)
+        os.replace(temporary_path, manifest_path)
+        self._evict(keep=key)
+
+    def _evict(self, keep: Optional[str] = None):
+        # Group files by key. Recency is tracked on the manifest. The table
+        # keep (the one just stored) counts towards the size, but is never
+        # evicted, even if it alone exceeds max_size.
+        entries = {}
+        for file_name in os.listdir(self.directory):
+            if file_name.endswith('.tmp'):
+                continue
+            key = file_name.split('.')[0]
+            path = os.path.join(self.directory, file_name)
+            try:
+                stat = os.stat(path)
+            except FileNotFoundError:
+                continue
+            last_used, size, paths = entries.get(key, (0.0, 0, []))
+            if file_name.endswith('.json'):
+                last_used = stat.st_mtime
+            entries[key] = (last_used, size + stat.st_size, paths + [path])
+
+        total_size = sum(size for _, size, _ in entries.values())
+        for key, (_, size, paths) in sorted(entries.items(), key=lambda item: item[1]):
+            if total_size <= self.max_size:
+                break
+            if key == keep:
+                continue
+            # Remove the manifest first, so the table is never seen half-deleted
+            for path in sorted(paths, key=lambda path: not path.endswith('.json')):
+                try:
+                    os.remove(path)
+                except FileNotFoundError:
+                    pass
+            total_size -= size
@@ -0,0 +1,114 @@
+import argparse
+import json
+import os
+import socketserver
+import stat
+import sys
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+
+import profiling
+import project
+from projector import Projector
+
+# Persistent process running project.py jobs sent over a Unix socket
+# (project.py --daemon <socket>). Projectors and their compiled lookup
+# tables are kept across jobs, so a job with known parameters only costs
+# decoding, remapping and encoding.
+
+# Projector arguments which determine the lookup table, besides the input size
+PROJECTOR_ARGUMENTS = (
+    'in_projection', 'out_projection', 'width', 'height', 'rotation', 'rotation_quaternion',
+    'filter', 'samples', 'sample_kernel', 'adaptive_samples', 'mipmap', 'hemi_fov_x', 'hemi_fov_y',
+)
+
+
+class ProjectorPool:
+    """
+    The most recently used Projectors, by input size and parameters.
+    Projectors are compiled outside of the lock, so jobs for other
+    projections are not held up, while jobs needing the same projection
+    wait for the first one to compile it.
+    """
+
+    def __init__(self, max_size: int):
+        self.max_size = max_size
+        # key -> Future of the Projector
+        self.projectors = OrderedDict()
+        self.lock = threading.Lock()
+
+    def get(self, args, input_size) -> Projector:
+        key = (tuple(input_size),) + tuple(getattr(args, name) for name in PROJECTOR_ARGUMENTS)
+        with self.lock:
+            future = self.projectors.get(key)
+            compiling = future is None
+            if compiling:
+                future = Future()
+                self.projectors[key] = future
+                if len(self.projectors) > self.max_size:
+                    self.projectors.popitem(last=False)
+            self.projectors.move_to_end(key)
+
+        if compiling:
+            try:
+                projector = Projector(input_size=input_size, **Projector.cli_options(args))
+                if not args.tile_size:
+                    projector.compile()
+            except BaseException as error:
+                # Let later jobs try again
+                with self.lock:
+                    if self.projectors.get(key) is future:
+                        del self.projectors[key]
+                future.set_exception(error)
+                raise
+            future.set_result(projector)
+        return future.result()
+
+
+class JobHandler(socketserver.StreamRequestHandler):
+    def handle(self):
+        # One job per connection: a line of JSON with the project.py
+        # arguments, answered by a line of JSON
+        start = time.perf_counter()
+        try:
+            args = project.parser.parse_args([])
+            vars(args).update(json.loads(self.rfile.readline()))
+            project.run(args, self.server.projectors.get)
+            reply = {'output': args.out, 'seconds': time.perf_counter() - start}
+        except Exception as error:
+            reply = {'error': f'{type(error).__name__}: {error}'}
+        self.wfile.write(json.dumps(reply).encode('utf-8') + b'\n')
+
+
+class DaemonServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    daemon_threads = True
+
+    def __init__(self, socket_path: str, projectors: ProjectorPool):
+        self.projectors = projectors
+        super().__init__(socket_path, JobHandler)
+
+
+if __name__ == '__main__':
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--socket', type=str, required=True, help='Path of the Unix socket to listen on')
+    parser.add_argument('--max-projectors', type=int, default=16, help='Number of compiled projections kept in memory')
+    parser.add_argument('--profile', type=str, help='Write stage timings and counters of all jobs to this file at exit, as Chrome trace-event JSON')
+    args = parser.parse_args()
+    if args.profile:
+        profiling.enable(args.profile)
+
+    # Replace the socket of a previous daemon
+    if os.path.exists(args.socket) and stat.S_ISSOCK(os.stat(args.socket).st_mode):
+        os.unlink(args.socket)
+
+    server = DaemonServer(args.socket, ProjectorPool(args.max_projectors))
+    print(f"Listening on {args.socket}", file=sys.stderr)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+        os.unlink(args.socket)
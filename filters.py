@@ -0,0 +1,74 @@
+from typing import Optional, Tuple
+
+import numpy as np
+
+from options import FILTERS, SUPERSAMPLING_KERNELS
+
+
+def _cubic_weights(t: np.ndarray) -> np.ndarray:
+    # Keys cubic convolution kernel with a=-0.5 (Catmull-Rom),
+    # for the taps at offsets -1, 0, 1 and 2
+    t2 = t * t
+    t3 = t2 * t
+    return np.stack((
+        (-t3 + 2.0 * t2 - t) / 2.0,
+        (3.0 * t3 - 5.0 * t2 + 2.0) / 2.0,
+        (-3.0 * t3 + 4.0 * t2 + t) / 2.0,
+        (t3 - t2) / 2.0,
+    ), axis=-1)
+
+
+def filter_taps(filter_name: str, positions: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # One-dimensional filter taps around continuous pixel positions.
+    # Returns integer tap positions and their weights, both of shape
+    # positions.shape + (number of taps,).
+    base = np.floor(positions)
+    t = positions - base
+    base = base.astype(np.int64)[..., np.newaxis]
+
+    if filter_name == 'nearest':
+        return base, np.ones(t.shape + (1,))
+    if filter_name == 'bilinear':
+        return base + np.arange(2), np.stack((1.0 - t, t), axis=-1)
+    if filter_name == 'bicubic':
+        return base + np.arange(-1, 3), _cubic_weights(t)
+
+    raise ValueError(f'Unknown filter: {filter_name}')
+
+
+def filter_size(filter_name: str) -> int:
+    # Number of taps of the filter along one axis
+    return filter_taps(filter_name, np.zeros(1))[0].shape[-1]
+
+
+def sample_offsets(samples: int, kernel: str = 'box') -> Tuple[np.ndarray, np.ndarray]:
+    # Offsets (in output pixels) and normalized weights of N super-samples
+    # along one axis. Returns two arrays of length N.
+    offsets = np.arange(samples) / samples
+    # Distance of each sub-sample from the center of the pixel
+    distances = offsets - (samples - 1) / (2.0 * samples)
+
+    if kernel == 'box':
+        weights = np.ones(samples)
+    elif kernel == 'tent':
+        weights = 1.0 - np.abs(distances)
+    elif kernel == 'gaussian':
+        weights = np.exp(-distances * distances / (2.0 * 0.5 * 0.5))
+    else:
+        raise ValueError(f'Unknown super-sampling kernel: {kernel}')
+    return offsets, weights / weights.sum()
+
+
+def subpixel_offsets(
+    samples: int,
+    kernel: str = 'box',
+    samples_y: Optional[int] = None,
+) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Offsets (in output pixels) and normalized weights of an NxM
+    # super-sampling grid, N samples along x and M (default N) along y.
+    # Returns three arrays of length N*M.
+    offsets_x, weights_x = sample_offsets(samples, kernel)
+    offsets_y, weights_y = sample_offsets(samples if samples_y is None else samples_y, kernel)
+    offsets_x, offsets_y = np.meshgrid(offsets_x, offsets_y)
+    weights = np.outer(weights_y, weights_x)
+    return offsets_x.ravel(), offsets_y.ravel(), weights.ravel() / weights.sum()
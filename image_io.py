@@ -0,0 +1,87 @@
+import os
+
+import numpy as np
+from PIL import Image
+
+# Reading and writing images of any supported dtype and channel count as
+# arrays of shape (height, width[, channels]). Raw .npy arrays are
+# memory-mapped when read, so they are remapped straight from the file.
+
+# Pillow modes which do not map to an array directly, and the mode to
+# convert them to
+_CONVERTED_MODES = {
+    '1': 'L',
+    'P': 'RGB',
+    'PA': 'RGBA',
+    'CMYK': 'RGB',
+    'YCbCr': 'RGB',
+    'LAB': 'RGB',
+    'HSV': 'RGB',
+}
+
+
+# Channel counts Pillow writes, by format and sample type. Other formats
+# are written as 8-bit images only.
+_WRITABLE_CHANNELS = {
+    'JPEG': {np.dtype(np.uint8): (1, 3)},
+    'PNG': {np.dtype(np.uint8): (1, 2, 3, 4), np.dtype(np.uint16): (1,)},
+    'TIFF': {
+        np.dtype(np.uint8): (1, 2, 3, 4),
+        np.dtype(np.uint16): (1,),
+        np.dtype(np.int32): (1,),
+        np.dtype(np.float32): (1,),
+    },
+}
+_DEFAULT_WRITABLE_CHANNELS = {np.dtype(np.uint8): (1, 3, 4)}
+
+
+def read_image(path: str) -> np.ndarray:
+    # uint8 images with 1-4 channels (L, LA, RGB, RGBA), 16-bit and 32-bit
+    # integer and float32 grayscale images keep their data as is. Other
+    # dtypes and channel counts, like HDR RGB panoramas, can be read from
+    # .npy files.
+    if path.endswith('.npy'):
+        return np.load(path, mmap_mode='r')
+    image = Image.open(path)
+    mode = _CONVERTED_MODES.get(image.mode)
+    if image.mode == 'P' and 'transparency' in image.info:
+        mode = 'RGBA'
+    if mode:
+        image = image.convert(mode)
+    return np.asarray(image)
+
+
+def writable_channels(path: str, dtype, channels: int) -> int:
+    # Number of channels write_image writes to path for images of the given
+    # sample type and channel count. Formats without an alpha channel, like
+    # JPEG, drop it. Raises ValueError if the format cannot hold the image,
+    # so that callers can check before rendering.
+    if path.endswith('.npy'):
+        return channels
+    image_format = Image.registered_extensions().get(os.path.splitext(path)[1].lower())
+    if image_format is None:
+        raise ValueError(f'Unknown image format of {path}')
+    supported = _WRITABLE_CHANNELS.get(image_format, _DEFAULT_WRITABLE_CHANNELS).get(np.dtype(dtype), ())
+    if channels in supported:
+        return channels
+    if channels in (2, 4) and channels - 1 in supported:
+        return channels - 1
+    raise ValueError(f'Cannot write {channels} channel(s) of {np.dtype(dtype)} to {path}, use .npy instead')
+
+
+def image_channels(buffer: np.ndarray) -> int:
+    # Channels of an image of shape (height, width[, channels])
+    return buffer.shape[2] if buffer.ndim == 3 else 1
+
+
+def write_image(path: str, buffer: np.ndarray):
+    # Counterpart of read_image. Image formats are written with Pillow,
+    # which supports 16-bit and float data for single channels only, see
+    # writable_channels.
+    if path.endswith('.npy'):
+        np.save(path, buffer)
+        return
+    channels = writable_channels(path, buffer.dtype, image_channels(buffer))
+    if buffer.ndim == 3:
+        buffer = buffer[:, :, 0] if channels == 1 else buffer[:, :, :channels]
+    Image.fromarray(np.ascontiguousarray(buffer)).save(path, quality=90)
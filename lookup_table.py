@@ -0,0 +1,605 @@
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+
+import profiling
+from filters import filter_size, sample_offsets, subpixel_offsets
+from mipmap import atlas_layout, build_atlas, level_sizes, max_levels, wraps_horizontally
+
+# Largest distance between the samples of adaptive super-sampling along an
+# output axis, in input pixels. Tuned on fine gratings: Closer samples cost
+# more than uniform super-sampling reducing aliasing as much.
+SAMPLE_SPACING = 4 / 3
+
+# Largest number of taps (output pixels times taps per pixel) built at once.
+# Building needs several wide temporary arrays per tap, so tables are built
+# in bands of output rows, each narrowed to the table types before the next.
+BUILD_BAND_TAPS = 1 << 22
+
+
+def narrowest_index_dtype(count: int) -> np.dtype:
+    # Smallest unsigned integer type able to address count elements
+    for dtype in (np.uint16, np.uint32):
+        if count <= np.iinfo(dtype).max + 1:
+            return np.dtype(dtype)
+    return np.dtype(np.uint64)
+
+
+def _bands(row_taps: np.ndarray) -> List[Tuple[int, int]]:
+    # (start, end) of bands of consecutive rows with up to BUILD_BAND_TAPS
+    # taps each (but at least one row), for the number of taps of each row
+    bands = []
+    start = taps = 0
+    for row, count in enumerate(row_taps):
+        if row > start and taps + count > BUILD_BAND_TAPS:
+            bands.append((start, row))
+            start, taps = row, 0
+        taps += count
+    bands.append((start, len(row_taps)))
+    return bands
+
+
+def _gather(input_pixels: np.ndarray, indices: np.ndarray, weights: Optional[np.ndarray]) -> np.ndarray:
+    # Weighted sums of the input pixels (N, channels) at the tap indices
+    # (count, K). Single taps have weight one and are copied.
+    if indices.shape[1] == 1:
+        return np.take(input_pixels, indices[:, 0], axis=0)
+
+    # float32 unless the input needs more precision
+    accumulator = np.zeros((len(indices), input_pixels.shape[1]), dtype=np.promote_types(input_pixels.dtype, np.float32))
+    # Negative weights (bicubic) ring around edges. Integer outputs are
+    # clipped to their type; float outputs (e.g. non-negative HDR values)
+    # are clamped to the range of the pixel's weighted taps.
+    is_integer = np.issubdtype(input_pixels.dtype, np.integer)
+    clamp = not is_integer and bool((weights < 0).any())
+    if clamp:
+        lower = np.full_like(accumulator, np.inf)
+        upper = np.full_like(accumulator, -np.inf)
+    for tap in range(indices.shape[1]):
+        values = np.take(input_pixels, indices[:, tap], axis=0)
+        accumulator += weights[:, tap, np.newaxis] * values
+        if clamp:
+            weighted = weights[:, tap, np.newaxis] != 0
+            np.minimum(lower, values, out=lower, where=weighted)
+            np.maximum(upper, values, out=upper, where=weighted)
+    if is_integer:
+        limits = np.iinfo(input_pixels.dtype)
+        accumulator = np.clip(np.rint(accumulator), limits.min, limits.max)
+    elif clamp:
+        np.clip(accumulator, lower, upper, out=accumulator)
+    return accumulator
+
+
+class LookupTable:
+    """
+    Precomputed mapping from output pixels to weighted input pixels.
+
+    Only the valid output pixels are stored, in the form apply uses, so
+    that cached and shared tables are mapped without any copy: positions
+    holds their flat (row-major) output pixel indices and is omitted if all
+    pixels are valid. indices holds the flat input pixel indices of their K
+    filter taps, of shape (count, K), and weights the contributions of the
+    taps, omitted for single-tap tables. Indices use the narrowest safe
+    integer type. Pixels in projection gaps are never looked up and render
+    black.
+    """
+
+    def __init__(
+        self,
+        shape,
+        indices: np.ndarray,
+        input_size,
+        positions: Optional[np.ndarray] = None,
+        weights: Optional[np.ndarray] = None,
+    ):
+        self.shape = tuple(int(size) for size in shape)
+        self.indices = indices
+        self.input_size = tuple(int(size) for size in input_size)
+        self.positions = positions
+        self.weights = weights
+
+    @classmethod
+    def build(
+        cls,
+        sampler,
+        filter_name: str = 'nearest',
+        samples: int = 1,
+        kernel: str = 'box',
+        region: Optional[Tuple[int, int, int, int]] = None,
+    ) -> "LookupTable":
+        # Table for the whole output image, or for an output region given as
+        # (x_start, y_start, x_end, y_end). With super-sampling, the taps of
+        # all NxN sub-samples are concatenated, weighted by the kernel.
+        with profiling.stage('build_table', filter=filter_name, samples=samples, region=region):
+            x_start, y_start, x_end, y_end = region or (0, 0, sampler.settings.out_width, sampler.settings.out_height)
+            row_taps = np.full(y_end - y_start, (x_end - x_start) * samples * samples * filter_size(filter_name) ** 2)
+            return cls._stacked([
+                cls._build(sampler, filter_name, samples, kernel, (x_start, y_start + band_start, x_end, y_start + band_end))
+                for band_start, band_end in _bands(row_taps)
+            ])
+
+    @classmethod
+    def _build(cls, sampler, filter_name, samples, kernel, region) -> "LookupTable":
+        xs, ys = sampler.get_output_grid(*(region or ()))
+        out_width, out_height = sampler.settings.out_width, sampler.settings.out_height
+
+        def sample_taps():
+            for offset_x, offset_y, sample_weight in zip(*subpixel_offsets(samples, kernel)):
+                tap_xs, tap_ys, weights = sampler.get_filter_taps(
+                    xs + offset_x / out_width,
+                    ys + offset_y / out_height,
+                    filter_name,
+                )
+                yield tap_xs, tap_ys, weights * sample_weight
+
+        return cls.from_sample_taps(sample_taps(), (sampler.settings.in_width, sampler.settings.in_height))
+
+    @classmethod
+    def _stacked(cls, bands: List["LookupTable"]) -> "LookupTable":
+        # Table of the tables of bands of rows, from top to bottom
+        if len(bands) == 1:
+            return bands[0]
+        shape = (sum(band.shape[0] for band in bands), bands[0].shape[1])
+        positions = None
+        if any(band.positions is not None for band in bands):
+            position_dtype = narrowest_index_dtype(shape[0] * shape[1])
+            all_positions = []
+            offset = 0
+            for band in bands:
+                band_positions = np.arange(len(band.indices)) if band.positions is None else band.positions
+                all_positions.append((band_positions.astype(np.int64) + offset).astype(position_dtype))
+                offset += band.shape[0] * band.shape[1]
+            positions = np.concatenate(all_positions)
+        return cls(
+            shape,
+            np.concatenate([band.indices for band in bands]),
+            bands[0].input_size,
+            positions,
+            None if bands[0].weights is None else np.concatenate([band.weights for band in bands]),
+        )
+
+    @classmethod
+    def from_sample_taps(cls, sample_taps, input_size: Tuple[int, int]) -> "LookupTable":
+        # Table from the (tap_xs, tap_ys, weights) of several sub-samples, of
+        # shape (out_height, out_width, K) each, their weights already scaled
+        # by the sub-sample weights. Every sub-sample is narrowed before the
+        # next one is taken, so sample_taps can be a generator. Pixels
+        # without any weight are gaps.
+        in_width, in_height = input_size
+        index_dtype = narrowest_index_dtype(in_width * in_height)
+        all_indices, all_weights = [], []
+        for tap_xs, tap_ys, weights in sample_taps:
+            shape = weights.shape[:2]
+            indices = tap_ys.astype(np.int64) * in_width + tap_xs
+            all_indices.append(indices.reshape(-1, indices.shape[2]).astype(index_dtype))
+            all_weights.append(weights.reshape(-1, weights.shape[2]).astype(np.float32))
+        indices = np.concatenate(all_indices, axis=1)
+        weights = np.concatenate(all_weights, axis=1)
+        del all_indices, all_weights
+
+        valid = (weights != 0).any(axis=1)
+        positions = None
+        if not valid.all():
+            positions = np.flatnonzero(valid).astype(narrowest_index_dtype(valid.size))
+            indices = indices[positions]
+            weights = weights[positions]
+        return cls(shape, indices, input_size, positions, weights if weights.shape[1] > 1 else None)
+
+    @property
+    def taps(self) -> int:
+        return self.indices.shape[1]
+
+    @property
+    def valid(self) -> np.ndarray:
+        # Validity of the output pixels, of shape (out_height, out_width)
+        if self.positions is None:
+            return np.ones(self.shape, dtype=bool)
+        valid = np.zeros(self.shape[0] * self.shape[1], dtype=bool)
+        valid[self.positions] = True
+        return valid.reshape(self.shape)
+
+    def coordinates(self) -> Tuple[np.ndarray, np.ndarray]:
+        # Input pixel coordinates (xs, ys) of all taps, of shape (count, K),
+        # using the narrowest safe integer type
+        in_width, in_height = self.input_size
+        ys, xs = np.divmod(self.indices, in_width)
+        dtype = narrowest_index_dtype(max(in_width, in_height))
+        return xs.astype(dtype), ys.astype(dtype)
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        # Counterpart of LookupTable(**arrays), for storage and sharing
+        arrays = {
+            'shape': np.array(self.shape),
+            'indices': self.indices,
+            'input_size': np.array(self.input_size),
+        }
+        if self.positions is not None:
+            arrays['positions'] = self.positions
+        if self.weights is not None:
+            arrays['weights'] = self.weights
+        return arrays
+
+    def source_region(self) -> Optional[Tuple[int, int, int, int]]:
+        # Bounding box (x_start, y_start, x_end, y_end) of all input pixels
+        # used by valid output pixels, or None if the table only covers gaps
+        if not len(self.indices):
+            return None
+        xs, ys = self.coordinates()
+        return int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1
+
+    def cropped(self, region: Tuple[int, int, int, int]) -> "LookupTable":
+        # Table addressing an input buffer cropped to region,
+        # as returned by source_region
+        x_start, y_start, x_end, y_end = region
+        xs, ys = self.coordinates()
+        indices = (ys.astype(np.int64) - y_start) * (x_end - x_start) + (xs.astype(np.int64) - x_start)
+        return LookupTable(
+            self.shape,
+            indices.astype(narrowest_index_dtype((x_end - x_start) * (y_end - y_start))),
+            (x_end - x_start, y_end - y_start),
+            self.positions,
+            self.weights,
+        )
+
+    def tap_groups(self) -> List[Tuple[Optional[np.ndarray], np.ndarray, Optional[np.ndarray]]]:
+        # The taps of the valid output pixels, see AdaptiveLookupTable
+        return [(self.positions, self.indices, self.weights)]
+
+    def apply(self, input_buffer: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        # Remap an image buffer of shape (in_height, in_width, channels),
+        # optionally into a preallocated output buffer
+        with profiling.stage('remap', taps=self.taps):
+            return self._apply(input_buffer, out)
+
+    def _apply(self, input_buffer: np.ndarray, out: Optional[np.ndarray]) -> np.ndarray:
+        if out is None:
+            out = np.empty(self.shape + input_buffer.shape[2:], dtype=input_buffer.dtype)
+
+        channels = input_buffer.shape[2]
+        input_pixels = input_buffer.reshape(-1, channels)
+        if profiling.enabled:
+            profiling.count('pixels_processed', self.shape[0] * self.shape[1])
+            profiling.count('gap_pixels', self.shape[0] * self.shape[1] - len(self.indices))
+
+        samples = _gather(input_pixels, self.indices, self.weights)
+        if self.positions is None:
+            out[...] = samples.reshape(out.shape)
+        elif out.flags.c_contiguous:
+            output_pixels = out.reshape(-1, channels)
+            output_pixels[...] = 0
+            output_pixels[self.positions] = samples
+        else:
+            # e.g. a tile of a larger buffer
+            output_pixels = np.zeros((out.shape[0] * out.shape[1], channels), dtype=out.dtype)
+            output_pixels[self.positions] = samples
+            out[...] = output_pixels.reshape(out.shape)
+        return out
+
+
+class AdaptiveLookupTable:
+    """
+    Lookup table with a varying number of taps per output pixel.
+
+    Built with adaptive super-sampling: Each output pixel gets NxM samples,
+    N and M depending on the extent of its footprint in the input image
+    along the output x and y axes, so pixels where the mapping compresses
+    the input (e.g. near the poles of equi-rectangular input) are
+    super-sampled along the compressed axis, and the others are not.
+    Output pixels are grouped by their numbers of samples. Per group, positions
+    holds the flat output pixel indices, and indices and weights the taps
+    like in LookupTable, of shape (count, K). Pixels in no group are gaps.
+    """
+
+    def __init__(self, shape, input_size, groups: List[Tuple[np.ndarray, np.ndarray, np.ndarray]]):
+        self.shape = tuple(int(size) for size in shape)
+        self.input_size = tuple(int(size) for size in input_size)
+        self.groups = groups
+
+    @classmethod
+    def build(
+        cls,
+        sampler,
+        filter_name: str = 'nearest',
+        max_samples: int = 4,
+        kernel: str = 'box',
+        region: Optional[Tuple[int, int, int, int]] = None,
+    ) -> "AdaptiveLookupTable":
+        # Like LookupTable.build, with up to max_samples x max_samples samples
+        with profiling.stage('build_table', filter=filter_name, samples=max_samples, region=region, adaptive=True):
+            out_width, out_height = sampler.settings.out_width, sampler.settings.out_height
+            in_width, in_height = sampler.settings.in_width, sampler.settings.in_height
+            x_start, y_start, x_end, y_end = region or (0, 0, out_width, out_height)
+            # Samples along each output axis, so that the samples are at most
+            # SAMPLE_SPACING input pixels apart along both axes
+            footprint_x, footprint_y = sampler.get_region_footprint_axes(x_start, y_start, x_end, y_end)
+            samples_x = np.clip(np.ceil(footprint_x / SAMPLE_SPACING - 1e-6), 1, max_samples).astype(int)
+            samples_y = np.clip(np.ceil(footprint_y / SAMPLE_SPACING - 1e-6), 1, max_samples).astype(int)
+            # Pixels are grouped by their numbers of samples along both axes
+            pixel_samples = samples_y * (max_samples + 1) + samples_x
+
+            # Built in bands of rows, see BUILD_BAND_TAPS. The groups of all
+            # bands with the same number of taps per pixel are joined.
+            band_groups = {}
+            row_taps = (samples_x * samples_y).sum(axis=1) * filter_size(filter_name) ** 2
+            for band_start, band_end in _bands(row_taps):
+                xs, ys = sampler.get_output_grid(x_start, y_start + band_start, x_end, y_start + band_end)
+                band_samples = pixel_samples[band_start:band_end].ravel()
+                for key in np.unique(band_samples):
+                    positions = np.flatnonzero(band_samples == key)
+                    group_xs = xs.ravel()[positions]
+                    group_ys = ys.ravel()[positions]
+                    all_tap_xs, all_tap_ys, all_weights = [], [], []
+                    group_samples_y, group_samples_x = divmod(int(key), max_samples + 1)
+                    for offset_x, offset_y, sample_weight in zip(*subpixel_offsets(group_samples_x, kernel, group_samples_y)):
+                        tap_xs, tap_ys, weights = sampler.get_filter_taps(
+                            group_xs + offset_x / out_width,
+                            group_ys + offset_y / out_height,
+                            filter_name,
+                        )
+                        all_tap_xs.append(tap_xs)
+                        all_tap_ys.append(tap_ys)
+                        all_weights.append(weights * sample_weight)
+                    indices = np.concatenate(all_tap_ys, axis=1).astype(np.int64) * in_width + np.concatenate(all_tap_xs, axis=1)
+                    weights = np.concatenate(all_weights, axis=1)
+
+                    # Pixels without any weight are gaps
+                    valid = (weights != 0).any(axis=1)
+                    band_groups.setdefault(indices.shape[1], []).append((
+                        (positions[valid] + band_start * (x_end - x_start)).astype(narrowest_index_dtype(pixel_samples.size)),
+                        indices[valid].astype(narrowest_index_dtype(in_width * in_height)),
+                        weights[valid].astype(np.float32),
+                    ))
+            groups = [
+                tuple(np.concatenate(arrays) for arrays in zip(*band_groups[taps]))
+                for taps in sorted(band_groups)
+            ]
+            return cls(pixel_samples.shape, (in_width, in_height), groups)
+
+    @classmethod
+    def from_arrays(cls, arrays: Dict[str, np.ndarray]) -> "AdaptiveLookupTable":
+        # Counterpart of arrays
+        group_count = sum(1 for name in arrays if name.startswith('positions_'))
+        groups = [
+            (arrays[f'positions_{group}'], arrays[f'indices_{group}'], arrays[f'weights_{group}'])
+            for group in range(group_count)
+        ]
+        return cls(arrays['shape'], arrays['input_size'], groups)
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        arrays = {
+            'shape': np.array(self.shape),
+            'input_size': np.array(self.input_size),
+        }
+        for group, (positions, indices, weights) in enumerate(self.groups):
+            arrays[f'positions_{group}'] = positions
+            arrays[f'indices_{group}'] = indices
+            arrays[f'weights_{group}'] = weights
+        return arrays
+
+    @property
+    def valid(self) -> np.ndarray:
+        valid = np.zeros(self.shape[0] * self.shape[1], dtype=bool)
+        for positions, _, _ in self.groups:
+            valid[positions] = True
+        return valid.reshape(self.shape)
+
+    @property
+    def average_taps(self) -> float:
+        # Mean number of taps of the valid output pixels
+        pixels = sum(len(positions) for positions, _, _ in self.groups)
+        taps = sum(indices.size for _, indices, _ in self.groups)
+        return taps / max(pixels, 1)
+
+    def tap_groups(self) -> List[Tuple[Optional[np.ndarray], np.ndarray, Optional[np.ndarray]]]:
+        return self.groups
+
+    def source_region(self) -> Optional[Tuple[int, int, int, int]]:
+        # See LookupTable.source_region
+        if not any(len(positions) for positions, _, _ in self.groups):
+            return None
+        in_width = self.input_size[0]
+        ys, xs = np.divmod(np.concatenate([indices.ravel() for _, indices, _ in self.groups]), in_width)
+        return int(xs.min()), int(ys.min()), int(xs.max()) + 1, int(ys.max()) + 1
+
+    def cropped(self, region: Tuple[int, int, int, int]) -> "AdaptiveLookupTable":
+        # See LookupTable.cropped
+        x_start, y_start, x_end, y_end = region
+        in_width = self.input_size[0]
+        index_dtype = narrowest_index_dtype((x_end - x_start) * (y_end - y_start))
+        groups = []
+        for positions, indices, weights in self.groups:
+            ys, xs = np.divmod(indices.astype(np.int64), in_width)
+            indices = (ys - y_start) * (x_end - x_start) + (xs - x_start)
+            groups.append((positions, indices.astype(index_dtype), weights))
+        return AdaptiveLookupTable(self.shape, (x_end - x_start, y_end - y_start), groups)
+
+    def apply(self, input_buffer: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        # See LookupTable.apply
+        with profiling.stage('remap', taps=self.average_taps):
+            if out is None:
+                out = np.empty(self.shape + input_buffer.shape[2:], dtype=input_buffer.dtype)
+
+            channels = input_buffer.shape[2]
+            input_pixels = input_buffer.reshape(-1, channels)
+            if out.flags.c_contiguous:
+                output_pixels = out.reshape(-1, channels)
+                output_pixels[...] = 0
+            else:
+                # e.g. a tile of a larger buffer
+                output_pixels = np.zeros((out.shape[0] * out.shape[1], channels), dtype=out.dtype)
+
+            pixels = 0
+            for positions, indices, weights in self.groups:
+                output_pixels[positions] = _gather(input_pixels, indices, weights)
+                pixels += len(positions)
+            if profiling.enabled:
+                profiling.count('pixels_processed', self.shape[0] * self.shape[1])
+                profiling.count('gap_pixels', self.shape[0] * self.shape[1] - pixels)
+
+            if not out.flags.c_contiguous:
+                out[...] = output_pixels.reshape(out.shape)
+            return out
+
+
+class MipmapLookupTable(LookupTable):
+    """
+    Lookup table sampling a mip pyramid of the input, see mipmap.py.
+
+    Each output pixel samples the pyramid level whose pixels match its
+    footprint in the input, blending the two closest levels (trilinear
+    filtering with the bilinear filter), so its cost does not depend on how
+    much the input is minified. Super-samples are only spread along the
+    output axis with the larger footprint: Anisotropic footprints, like near
+    the poles of equi-rectangular input, are covered by N samples of a finer
+    level instead of a single blurry one. The indices address the atlas of
+    the pyramid levels first_level to levels - 1, which apply builds from
+    each input image of base_size.
+    """
+
+    def __init__(
+        self,
+        shape,
+        indices: np.ndarray,
+        input_size,
+        base_size,
+        levels: int,
+        first_level: int = 0,
+        wrap_x: bool = False,
+        positions: Optional[np.ndarray] = None,
+        weights: Optional[np.ndarray] = None,
+    ):
+        super().__init__(shape, indices, input_size, positions, weights)
+        self.base_size = tuple(int(size) for size in base_size)
+        self.levels = int(levels)
+        self.first_level = int(first_level)
+        self.wrap_x = bool(wrap_x)
+
+    @classmethod
+    def build(
+        cls,
+        sampler,
+        filter_name: str = 'nearest',
+        samples: int = 1,
+        kernel: str = 'box',
+        region: Optional[Tuple[int, int, int, int]] = None,
+    ) -> "MipmapLookupTable":
+        # Like LookupTable.build, with N samples per pixel instead of NxN
+        with profiling.stage('build_table', filter=filter_name, samples=samples, region=region, mipmap=True):
+            settings = sampler.settings
+            in_width, in_height = settings.in_width, settings.in_height
+            xs, ys = sampler.get_output_grid(*(region or ()))
+            _, _, valid = sampler.get_source_positions(xs, ys)
+            footprint_x, footprint_y = sampler.get_region_footprint_axes(*(region or ()))
+            major_x = footprint_x >= footprint_y
+
+            # The samples divide the footprint along the major axis
+            sample_footprint = np.maximum(np.maximum(footprint_x, footprint_y) / samples, np.minimum(footprint_x, footprint_y))
+            top_level = max_levels(settings.input_projection, in_width, in_height) - 1
+            level = np.clip(np.log2(np.maximum(sample_footprint, 1.0)), 0, top_level)
+            lower_levels = np.floor(level).astype(int)
+            upper_levels = np.minimum(lower_levels + 1, top_level)
+            blend = (level - lower_levels).astype(np.float32)
+            level_choices = [(lower_levels, 1.0 - blend)]
+            if blend.any():
+                level_choices.append((upper_levels, blend))
+
+            # Only the levels used by valid pixels are stored, gaps are
+            # moved onto them
+            levels, first_level = 1, 0
+            if valid.any():
+                levels = max(int(choice_levels[valid].max()) for choice_levels, _ in level_choices) + 1
+                first_level = int(lower_levels[valid].min())
+            offsets, atlas_size = atlas_layout(in_width, in_height, levels, first_level)
+            sizes = level_sizes(in_width, in_height, levels)
+            sample_taps = []
+            for offset, sample_weight in zip(*sample_offsets(samples, kernel)):
+                in_xs, in_ys, valid = sampler.get_source_positions(
+                    xs + np.where(major_x, offset, 0.0) / settings.out_width,
+                    ys + np.where(major_x, 0.0, offset) / settings.out_height,
+                )
+                for pixel_levels, level_weights in level_choices:
+                    tap_xs, tap_ys, weights = cls._atlas_taps(
+                        sampler,
+                        in_xs,
+                        in_ys,
+                        valid,
+                        np.clip(pixel_levels, first_level, levels - 1),
+                        filter_name,
+                        sizes,
+                        offsets,
+                        first_level,
+                    )
+                    sample_taps.append((tap_xs, tap_ys, weights * (level_weights * sample_weight)[..., np.newaxis]))
+
+            table = LookupTable.from_sample_taps(sample_taps, atlas_size)
+            return cls(
+                table.shape,
+                table.indices,
+                atlas_size,
+                (in_width, in_height),
+                levels,
+                first_level,
+                wraps_horizontally(settings.input_projection),
+                table.positions,
+                table.weights,
+            )
+
+    @staticmethod
+    def _atlas_taps(sampler, in_xs, in_ys, valid, pixel_levels, filter_name, sizes, offsets, first_level):
+        # Atlas coordinates and weights of the filter taps around the input
+        # positions, on the given pyramid level of each position. sizes holds
+        # the size of every level, offsets the atlas offsets from first_level.
+        tap_xs = tap_ys = weights = None
+        for level in np.unique(pixel_levels):
+            selected = pixel_levels == level
+            scale = 2.0 ** level
+            # A pixel of the level covers scale x scale input pixels,
+            # and its value lies at their center
+            center_xs = (in_xs[selected] / scale).astype(np.int64)
+            center_ys = (in_ys[selected] / scale).astype(np.int64)
+            if filter_name == 'nearest':
+                level_xs, level_ys = center_xs, center_ys
+            else:
+                level_xs = (in_xs[selected] + 0.5) / scale - 0.5
+                level_ys = (in_ys[selected] + 0.5) / scale - 0.5
+            level_tap_xs, level_tap_ys, level_weights = sampler.get_filter_taps_at(
+                level_xs, level_ys, valid[selected], filter_name, sizes[level], (center_xs, center_ys),
+            )
+            if tap_xs is None:
+                taps_shape = in_xs.shape + level_weights.shape[-1:]
+                tap_xs = np.zeros(taps_shape, dtype=np.int64)
+                tap_ys = np.zeros(taps_shape, dtype=np.int64)
+                weights = np.zeros(taps_shape)
+            offset_x, offset_y = offsets[level - first_level]
+            tap_xs[selected] = level_tap_xs + offset_x
+            tap_ys[selected] = level_tap_ys + offset_y
+            weights[selected] = level_weights
+        return tap_xs, tap_ys, weights
+
+    def arrays(self) -> Dict[str, np.ndarray]:
+        arrays = super().arrays()
+        arrays['base_size'] = np.array(self.base_size)
+        arrays['levels'] = np.array(self.levels)
+        arrays['first_level'] = np.array(self.first_level)
+        arrays['wrap_x'] = np.array(self.wrap_x)
+        return arrays
+
+    def cropped(self, region: Tuple[int, int, int, int]) -> "LookupTable":
+        raise ValueError('Mip-mapped lookup tables address the whole pyramid and cannot be cropped')
+
+    def apply(self, input_buffer: np.ndarray, out: Optional[np.ndarray] = None) -> np.ndarray:
+        # Remap an image buffer of shape (base height, base width, channels)
+        # via its pyramid. The atlas of level 0 alone is the input itself.
+        if self.levels > 1:
+            input_buffer = build_atlas(input_buffer, self.levels, self.wrap_x, self.first_level)
+        return super().apply(input_buffer, out)
+
+
+def load_lookup_table(arrays: Dict[str, np.ndarray]):
+    # LookupTable, AdaptiveLookupTable or MipmapLookupTable from the arrays
+    # returned by arrays()
+    if 'levels' in arrays:
+        return MipmapLookupTable(**arrays)
+    if 'indices' in arrays:
+        return LookupTable(**arrays)
+    return AdaptiveLookupTable.from_arrays(arrays)
@@ -0,0 +1,82 @@
+from typing import List, Tuple
+
+import numpy as np
+
+import profiling
+from projections.base import Projection
+from projections.cubemap import CubemapProjection
+from projections.equirectangular import EquirectangularProjection
+from pyramid import downsample
+
+# Mip pyramids of input images, for sampling minified inputs at a constant
+# cost per output pixel. Level 0 is the input, each further level halves
+# the size of the previous one by averaging 2x2 blocks. The levels a lookup
+# table uses are stored in one atlas image, so that the table can address
+# them by flat indices like a plain input: The first (largest) level on the
+# left, the further levels stacked on top of each other to its right.
+
+
+def max_levels(projection: Projection, width: int, height: int) -> int:
+    # Number of levels of the pyramid of a width x height input image.
+    # Cube maps are only halved while their faces stay aligned to whole
+    # pixels, so that no level blends neighbouring faces.
+    levels = 1
+    while width > 1 or height > 1:
+        if isinstance(projection, CubemapProjection) and (
+            width % (2 * projection.columns) or height % (2 * projection.rows)
+        ):
+            break
+        width, height = -(-width // 2), -(-height // 2)
+        levels += 1
+    return levels
+
+
+def wraps_horizontally(projection: Projection) -> bool:
+    # Whether the left and right edges of images in the projection meet
+    return isinstance(projection, EquirectangularProjection)
+
+
+def level_sizes(width: int, height: int, levels: int) -> List[Tuple[int, int]]:
+    # (width, height) of each level
+    sizes = [(width, height)]
+    for _ in range(levels - 1):
+        width, height = -(-width // 2), -(-height // 2)
+        sizes.append((width, height))
+    return sizes
+
+
+def atlas_layout(
+    width: int,
+    height: int,
+    levels: int,
+    first_level: int = 0,
+) -> Tuple[List[Tuple[int, int]], Tuple[int, int]]:
+    # Offsets (x, y) of the levels first_level to levels - 1 in the atlas
+    # of a width x height image, and the (width, height) of the atlas
+    sizes = level_sizes(width, height, levels)[first_level:]
+    first_width, first_height = sizes[0]
+    offsets = [(0, 0)]
+    y = 0
+    for _, level_height in sizes[1:]:
+        offsets.append((first_width, y))
+        y += level_height
+    atlas_width = first_width + (sizes[1][0] if len(sizes) > 1 else 0)
+    return offsets, (atlas_width, max(first_height, y))
+
+
+def build_atlas(image: np.ndarray, levels: int, wrap_x: bool = False, first_level: int = 0) -> np.ndarray:
+    # Atlas of the levels first_level to levels - 1 of the pyramid of an
+    # image of shape (height, width, channels). With wrap_x set, an odd last
+    # column is averaged with the first one.
+    height, width = image.shape[:2]
+    offsets, (atlas_width, atlas_height) = atlas_layout(width, height, levels, first_level)
+    with profiling.stage('build_mipmap', levels=levels, first_level=first_level):
+        atlas = np.zeros((atlas_height, atlas_width) + image.shape[2:], dtype=image.dtype)
+        level = np.asarray(image)
+        for _ in range(first_level):
+            level = downsample(level, wrap_x)
+        for index, (x, y) in enumerate(offsets):
+            if index:
+                level = downsample(level, wrap_x)
+            atlas[y:y + level.shape[0], x:x + level.shape[1]] = level
+    return atlas
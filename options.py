@@ -0,0 +1,6 @@
+# Names of the sampling options. Kept free of heavy imports, so that
+# command line parsing does not need to load NumPy.
+
+FILTERS = ('nearest', 'bilinear', 'bicubic')
+
+SUPERSAMPLING_KERNELS = ('box', 'tent', 'gaussian')
@@ -0,0 +1,125 @@
+import atexit
+import json
+import os
+import threading
+import time
+from typing import Dict, List, Optional, Tuple
+
+# Stage timers and counters, written as Chrome trace-event JSON
+# (load in chrome://tracing or https://ui.perfetto.dev).
+# Profiling is enabled with enable() or the PROJECTORTOOL_PROFILE environment
+# variable, naming the trace file. While disabled, stage() returns a shared
+# no-op context manager and count() returns right away.
+
+PROFILE_ENVIRONMENT_VARIABLE = 'PROJECTORTOOL_PROFILE'
+
+enabled = False
+_trace_path: Optional[str] = None
+_events: List[dict] = []
+_counters: Dict[str, int] = {}
+_lock = threading.Lock()
+
+
+def _timestamp() -> float:
+    # Microseconds, on a clock shared by forked worker processes
+    return time.perf_counter() * 1e6
+
+
+class _Stage:
+    __slots__ = ('name', 'args', 'start')
+
+    def __init__(self, name: str, args: dict):
+        self.name = name
+        self.args = args
+
+    def __enter__(self):
+        self.start = _timestamp()
+        return self
+
+    def __exit__(self, *exc_info):
+        end = _timestamp()
+        _events.append({
+            'name': self.name,
+            'ph': 'X',
+            'ts': self.start,
+            'dur': end - self.start,
+            'pid': os.getpid(),
+            'tid': threading.get_ident(),
+            'args': self.args,
+        })
+
+
+class _NoStage:
+    __slots__ = ()
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc_info):
+        pass
+
+
+_no_stage = _NoStage()
+
+
+def stage(name: str, **args):
+    # Time a block: with profiling.stage('decode', path=path): ...
+    if not enabled:
+        return _no_stage
+    return _Stage(name, args)
+
+
+def count(name: str, value: int = 1):
+    # Add to a counter, e.g. pixels processed or bytes written
+    if not enabled:
+        return
+    with _lock:
+        _counters[name] = _counters.get(name, 0) + int(value)
+
+
+def take_events() -> Tuple[List[dict], Dict[str, int]]:
+    # Remove and return the events and counters recorded so far, so that
+    # worker processes can hand them to the main process for merge_events
+    global _events, _counters
+    with _lock:
+        events, counters = _events, _counters
+        _events, _counters = [], {}
+    return events, counters
+
+
+def merge_events(events: List[dict], counters: Dict[str, int]):
+    if not enabled:
+        return
+    _events.extend(events)
+    for name, value in counters.items():
+        count(name, value)
+
+
+def enable(trace_path: str):
+    # Record from now on, and write the trace to trace_path at exit.
+    # Worker processes inherit the setting through the environment.
+    global enabled, _trace_path
+    if not enabled:
+        atexit.register(write)
+    enabled = True
+    _trace_path = trace_path
+    os.environ[PROFILE_ENVIRONMENT_VARIABLE] = trace_path
+
+
+def write(trace_path: Optional[str] = None):
+    trace_path = trace_path or _trace_path
+    with _lock:
+        events = list(_events)
+        counters = dict(_counters)
+    # Final counter values, shown as counter tracks at the end of the trace
+    end = max((event['ts'] + event.get('dur', 0) for event in events), default=_timestamp())
+    events.extend(
+        {'name': name, 'ph': 'C', 'ts': end, 'pid': os.getpid(), 'args': {name: value}}
+        for name, value in sorted(counters.items())
+    )
+    with open(trace_path, 'w') as f:
+        json.dump({'traceEvents': events, 'otherData': {'counters': counters}}, f)
+
+
+if os.environ.get(PROFILE_ENVIRONMENT_VARIABLE):
+    enable(os.environ[PROFILE_ENVIRONMENT_VARIABLE])
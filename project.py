@@ -1,33 +1,142 @@
 import argparse
-from settings import Settings
-from sampler import Sampler
+import json
+import os
+import socket
+import sys
+import profiling
+from options import FILTERS, SUPERSAMPLING_KERNELS
 
-from PIL import Image
 from projections.map import projections_map
 
+# NumPy, PIL and the projection code are imported in run only, so that
+# listing projections, dry runs and daemon clients start quickly
+
 
 parser = argparse.ArgumentParser()
-parser.add_argument('image', type=str, help='Input image file')
-parser.add_argument('--in-projection', type=str, default='auto', help=f'Input image projection. One of {projections_map.keys()}')
-parser.add_argument('--out', type=str, default='out.jpg', help='Output file name')
-parser.add_argument('--out-projection', type=str, help=f'Output image projection. One of {projections_map.keys()}')
+parser.add_argument('image', type=str, nargs='?', help='Input image file. Raw (height, width[, channels]) .npy arrays of any dtype, e.g. float32 HDR panoramas, are memory-mapped.')
+parser.add_argument('--in-projection', type=str, default='auto', help=f'Input image projection. One of {", ".join(projections_map)}')
+parser.add_argument('--out', type=str, default='out.jpg', help='Output file name. Output to .npy is written as a raw array of the input dtype and channels.')
+parser.add_argument('--out-projection', type=str, help=f'Output image projection. One of {", ".join(projections_map)}')
 parser.add_argument('--width', type=int, help='Width of output image, in pixels')
 parser.add_argument('--height', type=int, help='Height of output image, in pixels')
 parser.add_argument('--rotation', type=str, help='Rotate by given angles (<x>,<y>,<z> in degrees)')
-parser.add_argument('--samples', type=int, default=1, help='Take NxN samples per pixel. Caution: Slow.')
+parser.add_argument('--rotation-quaternion', type=str, help='Rotate by given unit quaternion (<w>,<x>,<y>,<z>), after --rotation')
+parser.add_argument('--samples', type=int, default=1, help='Take NxN samples per pixel')
+parser.add_argument('--sample-kernel', type=str, default='box', choices=SUPERSAMPLING_KERNELS, help='Weighting of the NxN samples per pixel')
+sampling_group = parser.add_mutually_exclusive_group()
+sampling_group.add_argument('--adaptive-samples', action='store_true', help='Vary the samples per pixel with the local distortion, up to --samples x --samples where the input is compressed most')
+sampling_group.add_argument('--mipmap', action='store_true', help='Sample a mip pyramid of the input, on the level matching the footprint of each pixel, so that downscaling costs a constant number of taps per pixel. --samples then takes N samples along the more compressed axis only.')
+parser.add_argument('--filter', type=str, default='nearest', choices=FILTERS, help='Filter used when sampling the input image')
 parser.add_argument('--hemi-fov-x', type=int, default=180, help='Horizontal field of view (in degrees) of hemispherical projection')
 parser.add_argument('--hemi-fov-y', type=int, default=180, help='Vertical field of view (in degrees) of hemispherical projection')
+parser.add_argument('--split-faces', action='store_true', help='With cubemap output, write each face to its own file <out>_<face><ext>')
+parser.add_argument('--profile', type=str, help=f'Write stage timings and counters to this file, as Chrome trace-event JSON. Also enabled by the {profiling.PROFILE_ENVIRONMENT_VARIABLE} environment variable.')
+parser.add_argument('--tile-size', type=int, help='Render the output in tiles of this size, reading only the input regions needed per tile')
+parser.add_argument('--list-projections', action='store_true', help='List the supported projections and exit')
+parser.add_argument('--dry-run', action='store_true', help='Check the arguments and print the job instead of running it')
+parser.add_argument('--daemon', type=str, metavar='SOCKET', help='Send the job to a daemon listening on this Unix socket (see daemon.py) instead of running it')
+
+
+def run(args, get_projector=None):
+    # Project one image as described by the command line arguments.
+    # get_projector(args, input_size) returns the Projector to use,
+    # a new one by default.
+    import numpy as np
+    from image_io import image_channels, read_image, writable_channels, write_image
+    from projections.cubemap import CubemapProjection
+    from projector import Projector
+    from tiled import open_output_buffer
+
+    if args.split_faces and not issubclass(projections_map.get(args.out_projection, object), CubemapProjection):
+        raise ValueError('--split-faces requires a cubemap output projection')
+    if args.tile_size and args.mipmap:
+        raise ValueError('--mipmap needs the whole input and cannot be combined with --tile-size')
+    get_projector = get_projector or Projector.from_cli_args
+
+    with profiling.stage('decode', path=args.image):
+        input_image_buffer = read_image(args.image)
+    if profiling.enabled:
+        profiling.count('bytes_read', os.path.getsize(args.image))
+    # Fail before rendering if the output format cannot hold the image
+    writable_channels(args.out, input_image_buffer.dtype, image_channels(input_image_buffer))
+
+    in_height, in_width = input_image_buffer.shape[:2]
+    projector = get_projector(args, (in_width, in_height))
+
+    output_shape = projector.output_size[::-1] + input_image_buffer.shape[2:]
+    if args.split_faces:
+        # The faces are written separately, the full layout is never stored
+        output_image_buffer = np.zeros(output_shape, dtype=input_image_buffer.dtype)
+    else:
+        output_image_buffer = open_output_buffer(args.out, output_shape, input_image_buffer.dtype)
+    if args.tile_size:
+        # Render tile by tile, keeping memory use bounded by the tile size
+        projector.project_tiled(input_image_buffer, output_image_buffer, args.tile_size)
+    else:
+        # Render image with array lookups into the input buffer
+        projector.project(input_image_buffer, out=output_image_buffer)
+
+    with profiling.stage('encode', path=args.out):
+        if args.split_faces:
+            out_root, out_extension = os.path.splitext(args.out)
+            face_regions = projector.settings.output_projection.face_regions(*projector.output_size)
+            for face, (x_start, y_start, x_end, y_end) in face_regions.items():
+                face_buffer = output_image_buffer[y_start:y_end, x_start:x_end]
+                write_image(f'{out_root}_{face.name}{out_extension}', face_buffer)
+        elif isinstance(output_image_buffer, np.memmap):
+            output_image_buffer.flush()
+        else:
+            write_image(args.out, output_image_buffer)
+    if profiling.enabled and not args.split_faces:
+        profiling.count('bytes_written', os.path.getsize(args.out))
+
+
+def send_to_daemon(args) -> dict:
+    # Send the job as a line of JSON and wait for the reply line. Paths are
+    # made absolute, as the daemon may run in another working directory.
+    job = dict(vars(args), image=os.path.abspath(args.image), out=os.path.abspath(args.out))
+    with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as connection:
+        connection.connect(args.daemon)
+        connection.sendall(json.dumps(job).encode('utf-8') + b'\n')
+        with connection.makefile('rb') as reply_file:
+            return json.loads(reply_file.readline())
+
+
+def main():
+    args = parser.parse_args()
+    if args.list_projections:
+        print('\n'.join(projections_map))
+        return
+    if not args.image:
+        parser.error('the following arguments are required: image')
+    if not args.out_projection:
+        parser.error('the following arguments are required: --out-projection')
+    if args.in_projection not in projections_map and args.in_projection != 'auto':
+        parser.error(f'Unknown projection: {args.in_projection}')
+    if args.out_projection not in projections_map:
+        parser.error(f'Unknown projection: {args.out_projection}')
+
+    if args.dry_run:
+        if not os.path.isfile(args.image):
+            parser.error(f'Input image not found: {args.image}')
+        size = f'{args.width or "auto"}x{args.height or "auto"}'
+        print(f'{args.image} ({args.in_projection}) -> {args.out} ({args.out_projection}, {size})')
+        return
+
+    if args.daemon:
+        reply = send_to_daemon(args)
+        if 'error' in reply:
+            print(reply['error'], file=sys.stderr)
+            sys.exit(1)
+        return
 
-args = parser.parse_args()
-input_image = Image.open(args.image).convert('RGB')
-settings = Settings(args, input_image)
-sampler = Sampler(args, settings, lambda in_x, in_y: input_image.getpixel((in_x, in_y)))
-output_image = Image.new('RGB', (settings.out_width, settings.out_height), 'black')
+    if args.profile:
+        profiling.enable(args.profile)
+    try:
+        run(args)
+    except ValueError as error:
+        parser.error(str(error))
 
-# Render image
-for out_y in range(settings.out_height):
-    for out_x in range(settings.out_width):
-        sample = sampler.get_supersample(out_x, out_y, args.samples)
-        output_image.putpixel((out_x, out_y), sample)
 
-output_image.save(args.out, quality=90)
+if __name__ == '__main__':
+    main()
@@ -1,80 +1,113 @@
 import argparse
 import os
-import numpy as np
-from settings import Settings
-from sampler import Sampler
-
-from PIL import Image
+import sys
+import profiling
+from batch import render_images
+from cache import LookupTableCache
+from filters import FILTERS, SUPERSAMPLING_KERNELS
+from projector import Projector
+from stream import stream_frames
+
+from image_io import image_channels, read_image, writable_channels
 from projections.map import projections_map
 
 
 parser = argparse.ArgumentParser()
-parser.add_argument('image_list', type=str, help='Input image file')
-parser.add_argument('--in-projection', type=str, default='auto', help=f'Input image projection. One of {projections_map.keys()}')
-parser.add_argument('--out-projection', type=str, help=f'Output image projection. One of {projections_map.keys()}')
+parser.add_argument('image_list', type=str, nargs='?', help='Text file listing input image files. Not used with --stream.')
+parser.add_argument('--in-projection', type=str, default='auto', help=f'Input image projection. One of {", ".join(projections_map)}')
+parser.add_argument('--out-projection', type=str, help=f'Output image projection. One of {", ".join(projections_map)}')
 parser.add_argument('--out-directory', type=str, default='out')
+parser.add_argument('--out-format', type=str, default='jpg', choices=('jpg', 'png', 'tif', 'npy'), help='Format of the output files. Use npy (raw arrays) or tif (single channel) for 16-bit and float data.')
 parser.add_argument('--width', type=int, help='Width of output image, in pixels')
 parser.add_argument('--height', type=int, help='Height of output image, in pixels')
 parser.add_argument('--rotation', type=str, help='Rotate by given angles (<x>,<y>,<z> in degrees)')
+parser.add_argument('--rotation-quaternion', type=str, help='Rotate by given unit quaternion (<w>,<x>,<y>,<z>), after --rotation')
 parser.add_argument('--hemi-fov-x', type=int, default=180, help='Horizontal field of view (in degrees) of hemispherical projection')
 parser.add_argument('--hemi-fov-y', type=int, default=180, help='Vertical field of view (in degrees) of hemispherical projection')
+parser.add_argument('--samples', type=int, default=1, help='Take NxN samples per pixel')
+parser.add_argument('--sample-kernel', type=str, default='box', choices=SUPERSAMPLING_KERNELS, help='Weighting of the NxN samples per pixel')
+sampling_group = parser.add_mutually_exclusive_group()
+sampling_group.add_argument('--adaptive-samples', action='store_true', help='Vary the samples per pixel with the local distortion, up to --samples x --samples where the input is compressed most')
+sampling_group.add_argument('--mipmap', action='store_true', help='Sample a mip pyramid of the input, on the level matching the footprint of each pixel, so that downscaling costs a constant number of taps per pixel. --samples then takes N samples along the more compressed axis only.')
+parser.add_argument('--filter', type=str, default='nearest', choices=FILTERS, help='Filter used when sampling the input images')
+parser.add_argument('--workers', type=int, default=1, help='Number of worker processes rendering images in parallel')
+parser.add_argument('--prefetch', type=int, default=2, help='Number of images decoded ahead in background threads, 0 to render strictly in sequence. Without --workers only.')
+parser.add_argument('--writers', type=int, default=2, help='Number of threads encoding and saving output images. Without --workers only.')
+parser.add_argument('--write-queue-depth', type=int, default=4, help='Maximum number of output images waiting to be saved. Without --workers only.')
+parser.add_argument('--cache-directory', type=str, default=os.path.join(os.path.expanduser('~'), '.cache', 'projectortool'), help='Directory for cached lookup tables')
+parser.add_argument('--cache-size', type=int, default=1024, help='Maximum size of the lookup table cache, in megabytes. 0 disables caching.')
+parser.add_argument('--stream', action='store_true', help='Read raw RGB frames from stdin and write projected raw RGB frames to stdout')
+parser.add_argument('--in-width', type=int, help='Width of streamed input frames, in pixels')
+parser.add_argument('--in-height', type=int, help='Height of streamed input frames, in pixels')
+parser.add_argument('--profile', type=str, help=f'Write stage timings and counters to this file, as Chrome trace-event JSON. Also enabled by the {profiling.PROFILE_ENVIRONMENT_VARIABLE} environment variable.')
+parser.add_argument('--stream-dtype', type=str, default='uint8', choices=('uint8', 'uint16', 'float32'), help='Sample type of streamed frames, in native byte order')
+parser.add_argument('--channels', type=int, default=3, help='Number of interleaved channels of streamed frames')
+parser.add_argument('--queue-depth', type=int, default=2, help='Number of frames buffered between reading, remapping and writing when streaming')
 
 args = parser.parse_args()
-os.makedirs(args.out_directory, exist_ok=True)
-
-with open(args.image_list) as f:
-    image_path_list = f.readlines()
-
-first_image = Image.open(image_path_list[0].strip())
-settings = Settings(args, first_image)
-
-print("Computing projection lookup table")
-sample_recording = np.zeros((
-    settings.out_width,
-    settings.out_height,
-    2,
-), dtype=np.int16)
-
-
-def record_sample(in_x, in_y):
-    sample_recording[out_x, out_y, :] = [in_x, in_y]
-    return 0, 0, 0
-
-
-recording_sampler = Sampler(args, settings, record_sample)
-
-# Run recording
-for out_y in range(settings.out_height):
-    for out_x in range(settings.out_width):
-        recording_sampler.get_supersample(out_x, out_y)
-
-# Render output images, looking up the coordinates from the recording
-for image_index, image_path in enumerate(image_path_list):
-    print(f"Processing file {image_index+1}/{len(image_path_list)}")
-
-    input_image = Image.open(image_path.strip())
-    input_image_buffer = np.asarray(input_image)
-    input_image_buffer = np.swapaxes(input_image_buffer, 0, 1)
-
-    if input_image_buffer.ndim == 2:
-        input_image_buffer = np.expand_dims(input_image_buffer, 2)
-
-    output_image_buffer = np.zeros((
-        settings.out_width,
-        settings.out_height,
-        3
-    ), dtype=np.uint8)
-
-    for out_y in range(settings.out_height):
-        for out_x in range(settings.out_width):
-            in_x, in_y = sample_recording[out_x, out_y, :]
-            sample = input_image_buffer[in_x, in_y, :]
-            output_image_buffer[out_x, out_y, :] = sample
-
-    output_image_buffer = np.swapaxes(output_image_buffer, 0, 1)
-    output_image = Image.fromarray(output_image_buffer)
-    output_file_path = os.path.join(
-        args.out_directory,
-        f"frame_{image_index:04d}.jpg",
+if args.profile:
+    profiling.enable(args.profile)
+
+if args.stream:
+    if not args.in_width or not args.in_height:
+        parser.error('--stream requires --in-width and --in-height')
+    # stdout carries the frames, so report progress on stderr
+    log_file = sys.stderr
+    input_size = args.in_width, args.in_height
+else:
+    if not args.image_list:
+        parser.error('image_list is required unless --stream is given')
+    log_file = sys.stdout
+    os.makedirs(args.out_directory, exist_ok=True)
+
+    with open(args.image_list) as f:
+        image_path_list = f.readlines()
+
+    first_image_buffer = read_image(image_path_list[0].strip())
+    input_size = first_image_buffer.shape[1::-1]
+    # Fail before rendering if the output format cannot hold the images
+    try:
+        writable_channels(f'frame.{args.out_format}', first_image_buffer.dtype, image_channels(first_image_buffer))
+    except ValueError as error:
+        parser.error(str(error))
+
+cache = None
+if args.cache_size > 0:
+    cache = LookupTableCache(args.cache_directory, args.cache_size * 1024 * 1024)
+
+try:
+    projector = Projector.from_cli_args(args, input_size, cache)
+except ValueError as error:
+    # Invalid options, e.g. a malformed rotation
+    parser.error(str(error))
+projector.compile()
+if projector.from_cache:
+    print("Using cached projection lookup table", file=log_file)
+else:
+    print("Computed projection lookup table", file=log_file)
+lookup_table = projector.lookup_table
+
+if args.stream:
+    frame_count = stream_frames(
+        sys.stdin.buffer,
+        sys.stdout.buffer,
+        lookup_table,
+        projector.settings.in_width,
+        projector.settings.in_height,
+        channels=args.channels,
+        dtype=args.stream_dtype,
+        queue_depth=args.queue_depth,
+    )
+    print(f"Processed {frame_count} frames", file=log_file)
+    sys.exit(0)
+
+# Render output images, looking up the coordinates from the table
+jobs = [
+    (
+        image_path.strip(),
+        os.path.join(args.out_directory, f"frame_{image_index:04d}.{args.out_format}"),
     )
-    output_image.save(output_file_path, quality=90)
+    for image_index, image_path in enumerate(image_path_list)
+]
+for image_index, _ in enumerate(render_images(jobs, lookup_table, args.workers, args.prefetch, args.writers, args.write_queue_depth)):
+    print(f"Processed file {image_index+1}/{len(jobs)}")
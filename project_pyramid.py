@@ -0,0 +1,74 @@
+import argparse
+import profiling
+from filters import FILTERS, SUPERSAMPLING_KERNELS
+from image_io import image_channels, read_image, writable_channels
+from projector import Projector
+from pyramid import write_pyramid
+
+from projections.cubemap import CubemapProjection
+from projections.equirectangular import EquirectangularProjection
+from projections.map import projections_map
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('image', type=str, help='Input image file. Raw (height, width, channels) .npy arrays are memory-mapped.')
+parser.add_argument('--in-projection', type=str, default='auto', help=f'Input image projection. One of {", ".join(projections_map)}')
+parser.add_argument('--out-projection', type=str, default='cubemap-strip', help='Output image projection. A cube map layout or equirectangular.')
+parser.add_argument('--out-directory', type=str, default='out')
+parser.add_argument('--size', type=int, required=True, help='Size of the finest level, in pixels: The face size of cube maps, the image width otherwise')
+parser.add_argument('--tile-size', type=int, default=512, help='Size of the square tiles, in pixels')
+parser.add_argument('--levels', type=int, help='Number of levels. By default, levels are added until one tile covers a face or the image width.')
+parser.add_argument('--tile-format', type=str, default='jpg', choices=('jpg', 'png', 'tif', 'npy'), help='Format of the tiles. Use npy (raw arrays) or tif (single channel) for 16-bit and float data.')
+parser.add_argument('--rotation', type=str, help='Rotate by given angles (<x>,<y>,<z> in degrees)')
+parser.add_argument('--rotation-quaternion', type=str, help='Rotate by given unit quaternion (<w>,<x>,<y>,<z>), after --rotation')
+parser.add_argument('--samples', type=int, default=1, help='Take NxN samples per pixel')
+parser.add_argument('--sample-kernel', type=str, default='box', choices=SUPERSAMPLING_KERNELS, help='Weighting of the NxN samples per pixel')
+sampling_group = parser.add_mutually_exclusive_group()
+sampling_group.add_argument('--adaptive-samples', action='store_true', help='Vary the samples per pixel with the local distortion, up to --samples x --samples where the input is compressed most')
+sampling_group.add_argument('--mipmap', action='store_true', help='Sample a mip pyramid of the input, on the level matching the footprint of each pixel, so that downscaling costs a constant number of taps per pixel. --samples then takes N samples along the more compressed axis only.')
+parser.add_argument('--filter', type=str, default='nearest', choices=FILTERS, help='Filter used when sampling the input image')
+parser.add_argument('--hemi-fov-x', type=int, default=180, help='Horizontal field of view (in degrees) of hemispherical projection')
+parser.add_argument('--hemi-fov-y', type=int, default=180, help='Vertical field of view (in degrees) of hemispherical projection')
+parser.add_argument('--profile', type=str, help=f'Write stage timings and counters to this file, as Chrome trace-event JSON. Also enabled by the {profiling.PROFILE_ENVIRONMENT_VARIABLE} environment variable.')
+parser.add_argument('--workers', type=int, default=4, help='Number of threads writing tiles in parallel')
+
+args = parser.parse_args()
+if args.profile:
+    profiling.enable(args.profile)
+output_class = projections_map.get(args.out_projection)
+if output_class is None or not issubclass(output_class, (CubemapProjection, EquirectangularProjection)):
+    parser.error('--out-projection must be a cube map layout or equirectangular')
+
+if issubclass(output_class, CubemapProjection):
+    args.width, args.height = args.size * output_class.columns, args.size * output_class.rows
+else:
+    args.width, args.height = args.size, None
+
+with profiling.stage('decode', path=args.image):
+    input_image_buffer = read_image(args.image)
+# Fail before rendering if the tile format cannot hold the image
+try:
+    writable_channels(f'tile.{args.tile_format}', input_image_buffer.dtype, image_channels(input_image_buffer))
+except ValueError as error:
+    parser.error(str(error))
+
+in_height, in_width = input_image_buffer.shape[:2]
+try:
+    projector = Projector.from_cli_args(args, (in_width, in_height))
+except ValueError as error:
+    # Invalid options, e.g. a malformed rotation
+    parser.error(str(error))
+
+# Project the finest level only, the coarser levels are downsampled from it
+output_image_buffer = projector.project(input_image_buffer)
+manifest = write_pyramid(
+    output_image_buffer,
+    projector.settings.output_projection,
+    args.out_projection,
+    args.out_directory,
+    args.tile_size,
+    args.levels,
+    args.tile_format,
+    args.workers,
+)
+print(f"Wrote {len(manifest['levels'])} levels to {args.out_directory}")
@@ -0,0 +1,69 @@
+import argparse
+import os
+import profiling
+from filters import FILTERS, SUPERSAMPLING_KERNELS
+from image_io import image_channels, read_image, writable_channels, write_image
+from sequence import DirectionField, interpolate_keyframes, parse_keyframes, render_sequence
+from settings import ProjectionDetectionError, Settings
+
+from projections.map import projections_map
+
+
+parser = argparse.ArgumentParser()
+parser.add_argument('image', type=str, help='Input image file. Raw (height, width[, channels]) .npy arrays are memory-mapped.')
+parser.add_argument('--keyframes', type=str, required=True, help='Text file with one keyframe per line: <frame> <x>,<y>,<z> (degrees) or <frame> <w>,<x>,<y>,<z> (quaternion)')
+parser.add_argument('--frames', type=int, help='Number of frames. By default up to the last keyframe.')
+parser.add_argument('--in-projection', type=str, default='auto', help=f'Input image projection. One of {", ".join(projections_map)}')
+parser.add_argument('--out-projection', type=str, help=f'Output image projection. One of {", ".join(projections_map)}')
+parser.add_argument('--out-directory', type=str, default='out')
+parser.add_argument('--out-format', type=str, default='jpg', choices=('jpg', 'png', 'tif', 'npy'), help='Format of the output files. Use npy (raw arrays) or tif (single channel) for 16-bit and float data.')
+parser.add_argument('--width', type=int, help='Width of output image, in pixels')
+parser.add_argument('--height', type=int, help='Height of output image, in pixels')
+parser.add_argument('--samples', type=int, default=1, help='Take NxN samples per pixel')
+parser.add_argument('--sample-kernel', type=str, default='box', choices=SUPERSAMPLING_KERNELS, help='Weighting of the NxN samples per pixel')
+parser.add_argument('--filter', type=str, default='nearest', choices=FILTERS, help='Filter used when sampling the input image')
+parser.add_argument('--hemi-fov-x', type=int, default=180, help='Horizontal field of view (in degrees) of hemispherical projection')
+parser.add_argument('--hemi-fov-y', type=int, default=180, help='Vertical field of view (in degrees) of hemispherical projection')
+parser.add_argument('--workers', type=int, default=1, help='Number of threads rendering frames in parallel')
+parser.add_argument('--profile', type=str, help=f'Write stage timings and counters to this file, as Chrome trace-event JSON. Also enabled by the {profiling.PROFILE_ENVIRONMENT_VARIABLE} environment variable.')
+
+args = parser.parse_args()
+if args.profile:
+    profiling.enable(args.profile)
+
+with open(args.keyframes) as f:
+    keyframes = parse_keyframes(f)
+frame_count = args.frames or keyframes[-1][0] + 1
+rotations = interpolate_keyframes(keyframes, frame_count)
+
+with profiling.stage('decode', path=args.image):
+    input_image_buffer = read_image(args.image)
+if input_image_buffer.ndim == 2:
+    input_image_buffer = input_image_buffer[:, :, None]
+# Fail before rendering if the output format cannot hold the frames
+try:
+    writable_channels(f'frame.{args.out_format}', input_image_buffer.dtype, image_channels(input_image_buffer))
+except ValueError as error:
+    parser.error(str(error))
+
+try:
+    settings = Settings(
+        args.in_projection,
+        args.out_projection,
+        input_image_buffer.shape[1::-1],
+        args.width,
+        args.height,
+        args.hemi_fov_x,
+        args.hemi_fov_y,
+    )
+except ProjectionDetectionError as error:
+    parser.error(f'{error}, specify input projection using --in-projection')
+
+# The output directions are the same in every frame, only the rotation changes
+direction_field = DirectionField(settings, args.samples, args.sample_kernel)
+
+os.makedirs(args.out_directory, exist_ok=True)
+frames = render_sequence(input_image_buffer, direction_field, rotations, args.filter, args.workers)
+for frame_index, output_image_buffer in enumerate(frames):
+    write_image(os.path.join(args.out_directory, f"frame_{frame_index:04d}.{args.out_format}"), output_image_buffer)
+    print(f"Rendered frame {frame_index+1}/{frame_count}")
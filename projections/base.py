@@ -1,4 +1,6 @@
-from typing import Optional
+from typing import Optional, Tuple
+
+import numpy as np
 from projections.utils import Point, Direction
 
 
@@ -16,3 +18,29 @@ class Projection:
 
     def to_point(self, direction: Direction) -> Optional[Point]:
         raise NotImplementedError
+
+    def to_directions(self, xs: np.ndarray, ys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # Batch counterpart of to_direction, operating on arrays of normalized
+        # image coordinates. Returns direction vectors of shape xs.shape + (3,)
+        # and a boolean mask which is False where to_direction returns None.
+        raise NotImplementedError
+
+    def to_points(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Batch counterpart of to_point, operating on an array of direction
+        # vectors of shape (..., 3). Returns xs, ys and a boolean mask
+        # which is False where to_point returns None.
+        raise NotImplementedError
+
+    def clamp_taps(
+        self,
+        tap_xs: np.ndarray,
+        tap_ys: np.ndarray,
+        center_xs: np.ndarray,
+        center_ys: np.ndarray,
+        width: int,
+        height: int,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # Move filter taps (..., K) which fall outside of the image,
+        # or outside of the region around the center pixel (...,) that
+        # belongs to the same part of the scene, back onto valid pixels.
+        return np.clip(tap_xs, 0, width - 1), np.clip(tap_ys, 0, height - 1)
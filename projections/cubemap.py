@@ -1,5 +1,7 @@
-from typing import Optional
+from typing import Dict, Optional, Tuple
 from dataclasses import dataclass
+
+import numpy as np
 from projections.base import Projection
 from projections.utils import Point, Direction, Vector
 from enum import Enum
@@ -14,6 +16,17 @@ class Face(Enum):
     pos_z = 6
 
 
+# Position of each face in the 4x3 cross layout, in units of faces
+FACE_OFFSETS = {
+    Face.neg_x: (1, 1),
+    Face.pos_x: (3, 1),
+    Face.neg_y: (1, 0),
+    Face.pos_y: (1, 2),
+    Face.neg_z: (2, 1),
+    Face.pos_z: (0, 1)
+}
+
+
 @dataclass
 class FaceCoordinates:
     face: Face
@@ -34,52 +47,63 @@ class CubemapProjection(Projection):
     |      ####           |
     -----------------------
 
-    The ideal image will therefore have 4:3 aspect ratio,
-    which is why these numbers appear in the computations below.
+    The ideal image will therefore have 4:3 aspect ratio.
+    Subclasses arrange the faces differently, by overriding
+    face_offsets, columns and rows.
 
     The projection is done via an intermediate representation
     of directions: A tuple of face and face-coordinates (cubemap faces).
     """
 
-    @staticmethod
-    def aspect_ratio() -> float:
-        return 4.0/3.0
+    # Position of each face in the layout, and size of the layout, in faces
+    face_offsets = FACE_OFFSETS
+    columns = 4
+    rows = 3
 
-    @staticmethod
-    def face_coordinates_from_point(point: Point) -> Optional[FaceCoordinates]:
-        face_index_x = int(point.x * 4)
-        face_offset_x = point.x * 4 - face_index_x
-        face_index_y = int(point.y * 3)
-        face_offset_y = point.y * 3 - face_index_y
-        face_lookup = {
-            (1, 1): Face.neg_x,
-            (3, 1): Face.pos_x,
-            (1, 0): Face.neg_y,
-            (1, 2): Face.pos_y,
-            (2, 1): Face.neg_z,
-            (0, 1): Face.pos_z
-        }
+    @classmethod
+    def aspect_ratio(cls) -> float:
+        return float(cls.columns) / float(cls.rows)
+
+    @classmethod
+    def face_coordinates_from_point(cls, point: Point) -> Optional[FaceCoordinates]:
+        face_index_x = int(point.x * cls.columns)
+        face_offset_x = point.x * cls.columns - face_index_x
+        face_index_y = int(point.y * cls.rows)
+        face_offset_y = point.y * cls.rows - face_index_y
+        face_lookup = {offset: face for face, offset in cls.face_offsets.items()}
         face = face_lookup.get((face_index_x, face_index_y))
         if not face:
             return None
         return FaceCoordinates(face, face_offset_x, face_offset_y)
 
-    @staticmethod
-    def point_from_face_coordinates(face_coordinates: FaceCoordinates) -> Point:
-        offset_lookup = {
-            Face.neg_x: (1, 1),
-            Face.pos_x: (3, 1),
-            Face.neg_y: (1, 0),
-            Face.pos_y: (1, 2),
-            Face.neg_z: (2, 1),
-            Face.pos_z: (0, 1)
-        }
-        face_offsets = offset_lookup[face_coordinates.face]
+    @classmethod
+    def point_from_face_coordinates(cls, face_coordinates: FaceCoordinates) -> Point:
+        face_offsets = cls.face_offsets[face_coordinates.face]
         return Point(
-            x=(face_coordinates.x + face_offsets[0]) / 4.0,
-            y=(face_coordinates.y + face_offsets[1]) / 3.0
+            x=(face_coordinates.x + face_offsets[0]) / cls.columns,
+            y=(face_coordinates.y + face_offsets[1]) / cls.rows
         )
 
+    @staticmethod
+    def face_pixel_start(face_index, size: int, faces: int):
+        # First pixel p of an image row or column of the given size
+        # with p * faces // size == face_index
+        return -(-face_index * size // faces)
+
+    @classmethod
+    def face_regions(cls, width: int, height: int) -> Dict[Face, Tuple[int, int, int, int]]:
+        # Pixel region (x_start, y_start, x_end, y_end) of each face
+        # in an image of the given size
+        return {
+            face: (
+                cls.face_pixel_start(offset_x, width, cls.columns),
+                cls.face_pixel_start(offset_y, height, cls.rows),
+                cls.face_pixel_start(offset_x + 1, width, cls.columns),
+                cls.face_pixel_start(offset_y + 1, height, cls.rows),
+            )
+            for face, (offset_x, offset_y) in cls.face_offsets.items()
+        }
+
     @staticmethod
     def direction_from_face_coordinates(
         face_coordinates: FaceCoordinates
@@ -137,3 +161,189 @@ class CubemapProjection(Projection):
         face_coordinates = self.face_coordinates_from_direction(direction)
         point = self.point_from_face_coordinates(face_coordinates)
         return point
+
+    @staticmethod
+    def face_directions(face: Face, us: np.ndarray, vs: np.ndarray) -> np.ndarray:
+        # Batch counterpart of direction_from_face_coordinates for a single face
+        u = 2 * us - 1
+        v = 2 * vs - 1
+        one = np.ones_like(u)
+
+        if face == Face.neg_x:
+            return np.stack((-one, v, -u), axis=-1)
+        if face == Face.pos_x:
+            return np.stack((+one, v, u), axis=-1)
+        if face == Face.neg_y:
+            return np.stack((-v, -one, -u), axis=-1)
+        if face == Face.pos_y:
+            return np.stack((v, +one, -u), axis=-1)
+        if face == Face.neg_z:
+            return np.stack((u, v, -one), axis=-1)
+        if face == Face.pos_z:
+            return np.stack((-u, v, +one), axis=-1)
+
+    @staticmethod
+    def faces_from_components(
+        x: np.ndarray,
+        y: np.ndarray,
+        z: np.ndarray,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+        # Batch counterpart of face_coordinates_from_direction, for the
+        # components of direction vectors. Returns an array of Face values,
+        # the face coordinates and a mask which is False for null vectors.
+        abs_x, abs_y, abs_z = np.abs(x), np.abs(y), np.abs(z)
+        max_xyz = np.maximum(np.maximum(abs_x, abs_y), abs_z)
+        valid = max_xyz > 0
+        max_xyz = np.where(valid, max_xyz, 1.0)
+        x, y, z = x / max_xyz, y / max_xyz, z / max_xyz
+
+        # Same precedence as the scalar code: x before y before z
+        on_x = (abs_x >= abs_y) & (abs_x >= abs_z)
+        on_y = ~on_x & (abs_y >= abs_z)
+        faces = np.select(
+            [on_x & (x < 0), on_x, on_y & (y < 0), on_y, z < 0],
+            [Face.neg_x.value, Face.pos_x.value, Face.neg_y.value, Face.pos_y.value, Face.neg_z.value],
+            default=Face.pos_z.value,
+        )
+        us = np.select(
+            [faces == Face.neg_x.value, faces == Face.pos_x.value,
+             faces == Face.neg_y.value, faces == Face.pos_y.value,
+             faces == Face.neg_z.value],
+            [-z, z, -z, -z, x],
+            default=-x,
+        )
+        vs = np.select(
+            [faces == Face.neg_y.value, faces == Face.pos_y.value],
+            [-x, x],
+            default=y,
+        )
+        return faces, (us + 1.0) / 2.0, (vs + 1.0) / 2.0, valid
+
+    @classmethod
+    def faces_from_points(cls, xs: np.ndarray, ys: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Batch counterpart of face_coordinates_from_point. Returns an array
+        # of Face values (0 in the gaps of the layout) and face coordinates.
+        face_index_x = np.floor(xs * cls.columns).astype(int)
+        face_index_y = np.floor(ys * cls.rows).astype(int)
+        us = xs * cls.columns - face_index_x
+        vs = ys * cls.rows - face_index_y
+
+        face_grid = np.zeros((cls.rows, cls.columns), dtype=int)
+        for face, (offset_x, offset_y) in cls.face_offsets.items():
+            face_grid[offset_y, offset_x] = face.value
+        in_range = (
+            (face_index_x >= 0) & (face_index_x < cls.columns) &
+            (face_index_y >= 0) & (face_index_y < cls.rows)
+        )
+        faces = np.where(
+            in_range,
+            face_grid[np.clip(face_index_y, 0, cls.rows - 1), np.clip(face_index_x, 0, cls.columns - 1)],
+            0,
+        )
+        return faces, us, vs
+
+    @classmethod
+    def direction_components(
+        cls,
+        faces: np.ndarray,
+        us: np.ndarray,
+        vs: np.ndarray,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Components of the (unnormalized) direction vectors of face coordinates.
+        # Face directions are affine in the face coordinates, so look up
+        # constant, u and v coefficients per pixel instead of masking per face.
+        # Row 0 of the tables stands for projection gaps.
+        constants = np.zeros((len(Face) + 1, 3))
+        u_coefficients = np.zeros((len(Face) + 1, 3))
+        v_coefficients = np.zeros((len(Face) + 1, 3))
+        for face in Face:
+            constants[face.value] = cls.face_directions(face, np.float64(0.5), np.float64(0.5))
+            u_coefficients[face.value] = cls.face_directions(face, np.float64(1.0), np.float64(0.5)) - constants[face.value]
+            v_coefficients[face.value] = cls.face_directions(face, np.float64(0.5), np.float64(1.0)) - constants[face.value]
+
+        us = 2 * us - 1
+        vs = 2 * vs - 1
+        return tuple(
+            constants[:, axis][faces] +
+            u_coefficients[:, axis][faces] * us +
+            v_coefficients[:, axis][faces] * vs
+            for axis in range(3)
+        )
+
+    @classmethod
+    def points_from_faces(
+        cls,
+        faces: np.ndarray,
+        us: np.ndarray,
+        vs: np.ndarray,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # Batch counterpart of point_from_face_coordinates
+        offsets_x = np.zeros(len(Face) + 1)
+        offsets_y = np.zeros(len(Face) + 1)
+        for face, (offset_x, offset_y) in cls.face_offsets.items():
+            offsets_x[face.value] = offset_x
+            offsets_y[face.value] = offset_y
+        return (us + offsets_x[faces]) / cls.columns, (vs + offsets_y[faces]) / cls.rows
+
+    def to_directions(self, xs: np.ndarray, ys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        faces, us, vs = self.faces_from_points(xs, ys)
+        vectors = np.stack(self.direction_components(faces, us, vs), axis=-1)
+        return vectors, faces != 0
+
+    def to_points(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        faces, us, vs, valid = self.faces_from_components(vectors[..., 0], vectors[..., 1], vectors[..., 2])
+        xs, ys = self.points_from_faces(faces, us, vs)
+        return xs, ys, valid
+
+    def clamp_taps(
+        self,
+        tap_xs: np.ndarray,
+        tap_ys: np.ndarray,
+        center_xs: np.ndarray,
+        center_ys: np.ndarray,
+        width: int,
+        height: int,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # Keep taps on the face of the center pixel, so that filtering
+        # never blends in neighbouring faces or the gaps of the layout
+        face_index_x = np.clip(center_xs * self.columns // width, 0, self.columns - 1)[..., np.newaxis]
+        face_index_y = np.clip(center_ys * self.rows // height, 0, self.rows - 1)[..., np.newaxis]
+        face_start = self.face_pixel_start
+        return (
+            np.clip(tap_xs, face_start(face_index_x, width, self.columns), face_start(face_index_x + 1, width, self.columns) - 1),
+            np.clip(tap_ys, face_start(face_index_y, height, self.rows), face_start(face_index_y + 1, height, self.rows) - 1),
+        )
+
+
+class CubemapStripProjection(CubemapProjection):
+    """
+    All six faces in one row, without gaps (6:1 aspect ratio):
+    +x, -x, +y, -y, +z, -z
+    """
+    face_offsets = {
+        Face.pos_x: (0, 0),
+        Face.neg_x: (1, 0),
+        Face.pos_y: (2, 0),
+        Face.neg_y: (3, 0),
+        Face.pos_z: (4, 0),
+        Face.neg_z: (5, 0),
+    }
+    columns = 6
+    rows = 1
+
+
+class CubemapGridProjection(CubemapProjection):
+    """
+    The six faces in two rows of three, without gaps (3:2 aspect ratio):
+    +x, -x, +y in the top row, -y, +z, -z in the bottom row
+    """
+    face_offsets = {
+        Face.pos_x: (0, 0),
+        Face.neg_x: (1, 0),
+        Face.pos_y: (2, 0),
+        Face.neg_y: (0, 1),
+        Face.pos_z: (1, 1),
+        Face.neg_z: (2, 1),
+    }
+    columns = 3
+    rows = 2
@@ -0,0 +1,133 @@
+from math import pi
+from typing import Callable, Dict, Optional, Tuple, Type
+
+import numpy as np
+import profiling
+from projections.base import Projection
+from projections.cubemap import CubemapProjection
+from projections.equirectangular import EquirectangularProjection
+from projections.hemispherical import HemisphericalProjection
+from projections.utils import Rotation
+
+# Direct mappings are specialised kernels for frequent pairs of projections.
+# They map normalized output coordinates straight to normalized input
+# coordinates, skipping the intermediate direction vector arrays and the
+# redundant trigonometry of the generic to_directions/to_points chain.
+# A kernel returns (in_xs, in_ys, valid) like the generic chain would,
+# or None if it does not handle the given rotation.
+
+DirectMapping = Callable[
+    [Projection, Projection, np.ndarray, np.ndarray, Optional[Rotation]],
+    Optional[Tuple[np.ndarray, np.ndarray, np.ndarray]]
+]
+
+# (output projection class, input projection class) -> kernel
+direct_mappings: Dict[Tuple[Type[Projection], Type[Projection]], DirectMapping] = {}
+
+
+def direct_mapping(output_class: Type[Projection], input_class: Type[Projection]):
+    # Decorator registering a kernel for a pair of projections
+    def register(function: DirectMapping) -> DirectMapping:
+        direct_mappings[(output_class, input_class)] = function
+        return function
+    return register
+
+
+def find_direct_mapping(output_projection: Projection, input_projection: Projection) -> Optional[DirectMapping]:
+    # Kernels registered for a projection class also serve its subclasses,
+    # e.g. the cubemap layouts. The most specific registration wins.
+    for output_class in type(output_projection).__mro__:
+        for input_class in type(input_projection).__mro__:
+            function = direct_mappings.get((output_class, input_class))
+            if function is not None:
+                return function
+    return None
+
+
+def _equirectangular_components(xs: np.ndarray, ys: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+    # Direction vector components of equirectangular points
+    azimuth = xs * 2.0 * pi
+    altitude = (ys - 0.5) * pi
+    cos_altitude = np.cos(altitude)
+    return cos_altitude * np.cos(azimuth), np.sin(altitude), cos_altitude * np.sin(azimuth)
+
+
+def _equirectangular_points(x: np.ndarray, y: np.ndarray, z: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # Equirectangular points of direction vector components
+    azimuth = np.arctan2(z, x)
+    azimuth = np.where(azimuth < 0.0, azimuth + 2.0 * pi, azimuth)
+    altitude = np.arctan2(y, np.sqrt(x * x + z * z))
+    return azimuth / (2.0 * pi), altitude / pi + 0.5
+
+
+@direct_mapping(EquirectangularProjection, EquirectangularProjection)
+def equirectangular_to_equirectangular(output_projection, input_projection, xs, ys, rotation):
+    # Without rotation, or when only rotating around the vertical axis,
+    # this is the identity plus a horizontal shift
+    azimuth_offset = 0.0 if rotation is None else rotation.azimuth_offset()
+    if azimuth_offset is None:
+        return None
+    in_xs = (xs + azimuth_offset / (2.0 * pi)) % 1.0
+    return in_xs, ys, np.ones(xs.shape, dtype=bool)
+
+
+@direct_mapping(CubemapProjection, CubemapProjection)
+def cubemap_to_cubemap(output_projection, input_projection, xs, ys, rotation):
+    if rotation is not None or type(output_projection) is not type(input_projection):
+        return None
+    faces, _, _ = output_projection.faces_from_points(xs, ys)
+    return xs, ys, faces != 0
+
+
+@direct_mapping(HemisphericalProjection, HemisphericalProjection)
+def hemispherical_to_hemispherical(output_projection, input_projection, xs, ys, rotation):
+    if rotation is not None or (output_projection.fov_x, output_projection.fov_y) != (input_projection.fov_x, input_projection.fov_y):
+        return None
+    return xs, ys, (xs >= 0) & (xs <= 1) & (ys >= 0) & (ys <= 1)
+
+
+@direct_mapping(CubemapProjection, EquirectangularProjection)
+def equirectangular_to_cubemap(output_projection, input_projection, xs, ys, rotation):
+    faces, us, vs = output_projection.faces_from_points(xs, ys)
+    x, y, z = output_projection.direction_components(faces, us, vs)
+    if rotation is not None:
+        x, y, z = rotation.apply_to_components(x, y, z)
+    in_xs, in_ys = _equirectangular_points(x, y, z)
+    return in_xs, in_ys, faces != 0
+
+
+@direct_mapping(EquirectangularProjection, CubemapProjection)
+def cubemap_to_equirectangular(output_projection, input_projection, xs, ys, rotation):
+    x, y, z = _equirectangular_components(xs, ys)
+    if rotation is not None:
+        x, y, z = rotation.apply_to_components(x, y, z)
+    faces, us, vs, valid = input_projection.faces_from_components(x, y, z)
+    in_xs, in_ys = input_projection.points_from_faces(faces, us, vs)
+    return in_xs, in_ys, valid
+
+
+@direct_mapping(EquirectangularProjection, HemisphericalProjection)
+def hemispherical_to_equirectangular(output_projection, input_projection, xs, ys, rotation):
+    if rotation is None:
+        # The distance from the image center is the angle from the zenith,
+        # and the azimuth carries over unchanged
+        center_distance_angle = (1.0 - ys) * pi
+        azimuth = xs * 2.0 * pi
+        cos_azimuth, sin_azimuth = np.cos(azimuth), np.sin(azimuth)
+    else:
+        x, y, z = rotation.apply_to_components(*_equirectangular_components(xs, ys))
+        # cos/sin of the azimuth without computing the azimuth itself.
+        # Straight up or down, the azimuth is 0 like in Vector.as_angles.
+        horizontal_length = np.sqrt(x * x + z * z)
+        center_distance_angle = np.arctan2(horizontal_length, y)
+        has_azimuth = horizontal_length > 0
+        horizontal_length = np.where(has_azimuth, horizontal_length, 1.0)
+        cos_azimuth = np.where(has_azimuth, x / horizontal_length, 1.0)
+        sin_azimuth = np.where(has_azimuth, z / horizontal_length, 0.0)
+
+    in_xs = center_distance_angle * cos_azimuth / input_projection.fov_x + 0.5
+    in_ys = center_distance_angle * sin_azimuth / input_projection.fov_y + 0.5
+    valid = (in_xs >= 0) & (in_xs <= 1) & (in_ys >= 0) & (in_ys <= 1)
+    if profiling.enabled:
+        profiling.count('out_of_fov_evaluations', np.count_nonzero(~valid))
+    return in_xs, in_ys, valid
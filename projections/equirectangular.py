@@ -1,7 +1,9 @@
 from math import pi
-from typing import Optional
+from typing import Optional, Tuple
+
+import numpy as np
 from projections.base import Projection
-from projections.utils import Point, Direction, Angles
+from projections.utils import Point, Direction, Angles, vectors_from_angles, angles_from_vectors
 
 
 class EquirectangularProjection(Projection):
@@ -22,3 +24,28 @@ class EquirectangularProjection(Projection):
             x=angles.azimuth / (2.0 * pi),
             y=(angles.altitude / pi) + 0.5,
         )
+
+    def to_directions(self, xs: np.ndarray, ys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        vectors = vectors_from_angles(
+            azimuth=xs * 2.0 * pi,
+            altitude=(ys - 0.5) * pi,
+        )
+        return vectors, np.ones(np.shape(xs), dtype=bool)
+
+    def to_points(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        azimuth, altitude = angles_from_vectors(vectors)
+        xs = azimuth / (2.0 * pi)
+        ys = (altitude / pi) + 0.5
+        return xs, ys, np.ones(xs.shape, dtype=bool)
+
+    def clamp_taps(
+        self,
+        tap_xs: np.ndarray,
+        tap_ys: np.ndarray,
+        center_xs: np.ndarray,
+        center_ys: np.ndarray,
+        width: int,
+        height: int,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # The left and right image edges meet at the azimuth seam
+        return tap_xs % width, np.clip(tap_ys, 0, height - 1)
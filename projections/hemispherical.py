@@ -1,7 +1,10 @@
-from typing import Optional
+from typing import Optional, Tuple
 from math import atan2, pi, sqrt, sin, cos
+
+import numpy as np
+import profiling
 from projections.base import Projection
-from projections.utils import Direction, Angles, Point
+from projections.utils import Direction, Angles, Point, vectors_from_angles, angles_from_vectors
 
 
 class HemisphericalProjection(Projection):
@@ -43,10 +46,39 @@ class HemisphericalProjection(Projection):
 
         x = center_distance_angle * cos(angles.azimuth) / self.fov_x + 0.5
         if x < 0 or x > 1:
+            profiling.count('out_of_fov_evaluations')
             return None
 
         y = center_distance_angle * sin(angles.azimuth) / self.fov_y + 0.5
         if y < 0 or y > 1:
+            profiling.count('out_of_fov_evaluations')
             return None
 
         return Point(x, y)
+
+    def to_directions(self, xs: np.ndarray, ys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        center_x_angle = (xs - 0.5) * self.fov_x
+        center_y_angle = (ys - 0.5) * self.fov_y
+        center_distance_angle = np.sqrt(
+            center_x_angle * center_x_angle +
+            center_y_angle * center_y_angle
+        )
+        # No azimuth special cases needed here: arctan2 yields +-pi/2 for
+        # center_x_angle == 0, and the vector is the same either way.
+        vectors = vectors_from_angles(
+            azimuth=np.arctan2(center_y_angle, center_x_angle),
+            altitude=pi / 2.0 - center_distance_angle,
+        )
+        return vectors, np.ones(np.shape(xs), dtype=bool)
+
+    def to_points(self, vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        azimuth, altitude = angles_from_vectors(vectors)
+        center_distance_angle = pi / 2.0 - altitude
+
+        xs = center_distance_angle * np.cos(azimuth) / self.fov_x + 0.5
+        ys = center_distance_angle * np.sin(azimuth) / self.fov_y + 0.5
+        # Directions outside of the field of view are rejected
+        valid = (xs >= 0) & (xs <= 1) & (ys >= 0) & (ys <= 1)
+        if profiling.enabled:
+            profiling.count('out_of_fov_evaluations', np.count_nonzero(~valid))
+        return xs, ys, valid
@@ -1,9 +1,30 @@
-from projections.cubemap import CubemapProjection
-from projections.equirectangular import EquirectangularProjection
-from projections.hemispherical import HemisphericalProjection
-
-projections_map = {
-    'cubemap': CubemapProjection,
-    'equirectangular': EquirectangularProjection,
-    'hemispherical': HemisphericalProjection,
+import importlib
+from collections.abc import Mapping
+
+# Module and class name of each projection. The classes are imported on
+# first access, so listing the projection names does not load NumPy.
+_projection_classes = {
+    'cubemap': ('projections.cubemap', 'CubemapProjection'),
+    'cubemap-strip': ('projections.cubemap', 'CubemapStripProjection'),
+    'cubemap-grid': ('projections.cubemap', 'CubemapGridProjection'),
+    'equirectangular': ('projections.equirectangular', 'EquirectangularProjection'),
+    'hemispherical': ('projections.hemispherical', 'HemisphericalProjection'),
 }
+
+
+class _ProjectionsMap(Mapping):
+    def __getitem__(self, name: str):
+        module_name, class_name = _projection_classes[name]
+        return getattr(importlib.import_module(module_name), class_name)
+
+    def __contains__(self, name) -> bool:
+        return name in _projection_classes
+
+    def __iter__(self):
+        return iter(_projection_classes)
+
+    def __len__(self) -> int:
+        return len(_projection_classes)
+
+
+projections_map = _ProjectionsMap()
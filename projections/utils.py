@@ -1,6 +1,9 @@
-from math import pi, atan2, sqrt, sin, cos
+from math import pi, acos, atan2, sqrt, sin, cos
+from typing import Optional, Tuple
 from dataclasses import dataclass
 
+import numpy as np
+
 
 @dataclass
 class Point:
@@ -16,8 +19,8 @@ class Direction:
     def as_angles(self) -> "Angles":
         raise NotImplementedError
 
-    def rotated(self, angle_x: int, angle_y: int, angle_z: int) -> "Direction":
-        return self.as_vector().rotated(angle_x, angle_y, angle_z)
+    def rotated(self, angle_x: float, angle_y: float, angle_z: float) -> "Direction":
+        return Rotation.from_angles(angle_x, angle_y, angle_z).rotate(self)
 
 
 class Vector(Direction):
@@ -59,29 +62,6 @@ class Vector(Direction):
         angles = Angles(altitude=altitude, azimuth=azimuth)
         return angles
 
-    def rotated(self, angle_x: int, angle_y: int, angle_z: int) -> "Direction":
-
-        angle_x = float(angle_x) / 180.0 * pi
-        angle_y = float(angle_y) / 180.0 * pi
-        angle_z = float(angle_z) / 180.0 * pi
-
-        sin_x, cos_x = sin(angle_x), cos(angle_x)
-        y_dash = self.y * cos_x - self.z * sin_x
-        z_dash = self.y * sin_x + self.z * cos_x
-        self.y, self.z = y_dash, z_dash
-
-        sin_y, cos_y = sin(angle_y), cos(angle_y)
-        x_dash = self.x * cos_y - self.z * sin_y
-        z_dash = self.x * sin_y + self.z * cos_y
-        self.x, self.z = x_dash, z_dash
-
-        sin_z, cos_z = sin(angle_z), cos(angle_z)
-        x_dash = self.x * cos_z - self.y * sin_z
-        y_dash = self.x * sin_z + self.y * cos_z
-        self.x, self.y = x_dash, y_dash
-
-        return self
-
 
 class Angles(Direction):
     def __init__(self, azimuth: float, altitude: float):
@@ -135,3 +115,144 @@ class Angles(Direction):
 
         assert -0.5 * pi <= self.altitude <= 0.5 * pi
         assert 0 <= self.azimuth <= 2.0 * pi
+
+
+def vectors_from_angles(azimuth: np.ndarray, altitude: np.ndarray) -> np.ndarray:
+    # Batch counterpart of Angles.as_vector. Returns shape azimuth.shape + (3,)
+    cos_altitude = np.cos(altitude)
+    return np.stack((
+        cos_altitude * np.cos(azimuth),
+        np.sin(altitude),
+        cos_altitude * np.sin(azimuth),
+    ), axis=-1)
+
+
+def angles_from_vectors(vectors: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+    # Batch counterpart of Vector.as_angles. Returns (azimuth, altitude),
+    # with azimuth mapped to [0;2pi]
+    x, y, z = vectors[..., 0], vectors[..., 1], vectors[..., 2]
+    altitude = np.arctan2(y, np.sqrt(x * x + z * z))
+    azimuth = np.arctan2(z, x)
+    azimuth = np.where(azimuth < 0.0, azimuth + 2.0 * pi, azimuth)
+    return azimuth, altitude
+
+
+class Rotation:
+    """
+    A rotation of directions, stored as a single 3x3 matrix.
+
+    Rotations from angles turn around the x, y and z axes, in this order.
+    Build the rotation once and apply it to whole arrays of vectors.
+    """
+
+    def __init__(self, matrix: np.ndarray):
+        self.matrix = np.asarray(matrix, dtype=np.float64)
+
+    @classmethod
+    def from_angles(cls, angle_x: float, angle_y: float, angle_z: float) -> "Rotation":
+        # Angles in degrees
+        angle_x = float(angle_x) / 180.0 * pi
+        angle_y = float(angle_y) / 180.0 * pi
+        angle_z = float(angle_z) / 180.0 * pi
+
+        sin_x, cos_x = sin(angle_x), cos(angle_x)
+        sin_y, cos_y = sin(angle_y), cos(angle_y)
+        sin_z, cos_z = sin(angle_z), cos(angle_z)
+
+        rotation_x = np.array([
+            [1.0, 0.0, 0.0],
+            [0.0, cos_x, -sin_x],
+            [0.0, sin_x, cos_x],
+        ])
+        rotation_y = np.array([
+            [cos_y, 0.0, -sin_y],
+            [0.0, 1.0, 0.0],
+            [sin_y, 0.0, cos_y],
+        ])
+        rotation_z = np.array([
+            [cos_z, -sin_z, 0.0],
+            [sin_z, cos_z, 0.0],
+            [0.0, 0.0, 1.0],
+        ])
+        return cls(rotation_z @ rotation_y @ rotation_x)
+
+    @classmethod
+    def from_quaternion(cls, w: float, x: float, y: float, z: float) -> "Rotation":
+        # Unit quaternion w + xi + yj + zk. Normalized here, for robustness.
+        norm = sqrt(w * w + x * x + y * y + z * z)
+        w, x, y, z = w / norm, x / norm, y / norm, z / norm
+        return cls(np.array([
+            [1 - 2 * (y * y + z * z), 2 * (x * y - w * z), 2 * (x * z + w * y)],
+            [2 * (x * y + w * z), 1 - 2 * (x * x + z * z), 2 * (y * z - w * x)],
+            [2 * (x * z - w * y), 2 * (y * z + w * x), 1 - 2 * (x * x + y * y)],
+        ]))
+
+    def as_quaternion(self) -> Tuple[float, float, float, float]:
+        # Unit quaternion (w, x, y, z) with w >= 0, inverse of from_quaternion
+        m = self.matrix
+        trace = m[0, 0] + m[1, 1] + m[2, 2]
+        # Divide by the largest of the four components, for stability
+        if trace > max(m[0, 0], m[1, 1], m[2, 2]):
+            s = 2.0 * sqrt(1.0 + trace)
+            quaternion = (s / 4.0, (m[2, 1] - m[1, 2]) / s, (m[0, 2] - m[2, 0]) / s, (m[1, 0] - m[0, 1]) / s)
+        elif m[0, 0] >= m[1, 1] and m[0, 0] >= m[2, 2]:
+            s = 2.0 * sqrt(1.0 + m[0, 0] - m[1, 1] - m[2, 2])
+            quaternion = ((m[2, 1] - m[1, 2]) / s, s / 4.0, (m[0, 1] + m[1, 0]) / s, (m[0, 2] + m[2, 0]) / s)
+        elif m[1, 1] >= m[2, 2]:
+            s = 2.0 * sqrt(1.0 + m[1, 1] - m[0, 0] - m[2, 2])
+            quaternion = ((m[0, 2] - m[2, 0]) / s, (m[0, 1] + m[1, 0]) / s, s / 4.0, (m[1, 2] + m[2, 1]) / s)
+        else:
+            s = 2.0 * sqrt(1.0 + m[2, 2] - m[0, 0] - m[1, 1])
+            quaternion = ((m[1, 0] - m[0, 1]) / s, (m[0, 2] + m[2, 0]) / s, (m[1, 2] + m[2, 1]) / s, s / 4.0)
+        sign = -1.0 if quaternion[0] < 0 else 1.0
+        return tuple(float(sign * value) for value in quaternion)
+
+    def interpolate(self, other: "Rotation", t: float) -> "Rotation":
+        # Spherical linear interpolation, from this rotation (t=0)
+        # to the other one (t=1) along the shortest path
+        start = np.array(self.as_quaternion())
+        end = np.array(other.as_quaternion())
+        cos_angle = float(start @ end)
+        if cos_angle < 0.0:
+            end, cos_angle = -end, -cos_angle
+        if cos_angle > 0.9995:
+            # Nearly identical, linear interpolation is precise enough
+            return Rotation.from_quaternion(*(start + t * (end - start)))
+        angle = acos(cos_angle)
+        quaternion = (sin((1.0 - t) * angle) * start + sin(t * angle) * end) / sin(angle)
+        return Rotation.from_quaternion(*quaternion)
+
+    def then(self, other: "Rotation") -> "Rotation":
+        # This rotation followed by the other one
+        return Rotation(other.matrix @ self.matrix)
+
+    def rotate(self, direction: Direction) -> Vector:
+        vector = direction.as_vector()
+        x, y, z = self.matrix @ (vector.x, vector.y, vector.z)
+        return Vector(float(x), float(y), float(z))
+
+    def apply(self, vectors: np.ndarray) -> np.ndarray:
+        # Rotate an array of vectors of shape (..., 3)
+        return vectors @ self.matrix.T
+
+    def apply_to_components(
+        self,
+        x: np.ndarray,
+        y: np.ndarray,
+        z: np.ndarray,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Like apply, for vectors given as separate component arrays
+        m = self.matrix
+        return (
+            m[0, 0] * x + m[0, 1] * y + m[0, 2] * z,
+            m[1, 0] * x + m[1, 1] * y + m[1, 2] * z,
+            m[2, 0] * x + m[2, 1] * y + m[2, 2] * z,
+        )
+
+    def azimuth_offset(self) -> Optional[float]:
+        # If this is a pure rotation around the y (vertical) axis, the angle
+        # it adds to the azimuth of every direction (radians), else None
+        m = self.matrix
+        if not np.allclose(m[1], (0.0, 1.0, 0.0)) or not np.allclose(m[:, 1], (0.0, 1.0, 0.0)):
+            return None
+        return atan2(m[2, 0], m[0, 0])
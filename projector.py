@@ -0,0 +1,180 @@
+import sys
+from typing import Optional, Tuple, Union
+
+import numpy as np
+from PIL import Image
+
+from cache import LookupTableCache
+from lookup_table import AdaptiveLookupTable, LookupTable, MipmapLookupTable, load_lookup_table
+from projections.utils import Rotation
+from sampler import Sampler, parse_rotation
+from settings import ProjectionDetectionError, Settings
+from tiled import render_tiled
+
+
+class Projector:
+    """
+    Reusable conversion of images of one size from one projection into another.
+
+    The lookup table is compiled on first use (or loaded from the cache) and
+    kept, so projecting further images only costs the remapping itself.
+    """
+
+    def __init__(
+        self,
+        out_projection: str,
+        input_size: Tuple[int, int],
+        in_projection: str = 'auto',
+        out_width: Optional[int] = None,
+        out_height: Optional[int] = None,
+        rotation: Optional[Rotation] = None,
+        filter_name: str = 'nearest',
+        samples: int = 1,
+        sample_kernel: str = 'box',
+        hemi_fov_x: int = 180,
+        hemi_fov_y: int = 180,
+        cache: Optional[LookupTableCache] = None,
+        adaptive: bool = False,
+        mipmap: bool = False,
+    ):
+        # With adaptive set, samples is the maximum number of samples per
+        # axis, see AdaptiveLookupTable. With mipmap set, samples is the
+        # number of samples along one axis, see MipmapLookupTable.
+        if adaptive and mipmap:
+            raise ValueError('Adaptive super-sampling and mip-mapping cannot be combined')
+        self.settings = Settings(
+            in_projection,
+            out_projection,
+            input_size,
+            out_width,
+            out_height,
+            hemi_fov_x,
+            hemi_fov_y,
+        )
+        self.sampler = Sampler(self.settings, rotation)
+        self.filter_name = filter_name
+        self.samples = samples
+        self.sample_kernel = sample_kernel
+        self.adaptive = adaptive
+        self.mipmap = mipmap
+        self.cache = cache
+        # Whether the compiled lookup table was loaded from the cache
+        self.from_cache = False
+        self._lookup_table = None
+
+    @staticmethod
+    def cli_options(cli_args) -> dict:
+        # Constructor arguments given by the command line arguments,
+        # apart from the input size and cache
+        return dict(
+            out_projection=cli_args.out_projection,
+            in_projection=cli_args.in_projection,
+            out_width=cli_args.width,
+            out_height=cli_args.height,
+            rotation=parse_rotation(cli_args.rotation, cli_args.rotation_quaternion),
+            filter_name=cli_args.filter,
+            samples=cli_args.samples,
+            sample_kernel=cli_args.sample_kernel,
+            hemi_fov_x=cli_args.hemi_fov_x,
+            hemi_fov_y=cli_args.hemi_fov_y,
+            adaptive=cli_args.adaptive_samples,
+            mipmap=cli_args.mipmap,
+        )
+
+    @classmethod
+    def from_cli_args(cls, cli_args, input_size: Tuple[int, int], cache: Optional[LookupTableCache] = None) -> "Projector":
+        try:
+            return cls(input_size=input_size, cache=cache, **cls.cli_options(cli_args))
+        except ProjectionDetectionError as error:
+            # Ask the user to specify the projection. Reported on stderr, as
+            # stdout may carry streamed frames.
+            sys.exit(f'{error}, specify input projection using --in-projection')
+
+    @property
+    def input_size(self) -> Tuple[int, int]:
+        return self.settings.in_width, self.settings.in_height
+
+    @property
+    def output_size(self) -> Tuple[int, int]:
+        return self.settings.out_width, self.settings.out_height
+
+    @property
+    def is_compiled(self) -> bool:
+        return self._lookup_table is not None
+
+    @property
+    def lookup_table(self) -> Union[LookupTable, AdaptiveLookupTable, MipmapLookupTable]:
+        if self._lookup_table is None:
+            self.compile()
+        return self._lookup_table
+
+    def compile(self) -> "Projector":
+        # Build the lookup table, or load it from the cache
+        cache_key = None
+        if self.cache is not None:
+            cache_key = self.cache.key(
+                self.settings,
+                self.sampler.rotation,
+                filter=self.filter_name,
+                samples=self.samples,
+                sample_kernel=self.sample_kernel,
+                adaptive=self.adaptive,
+                mipmap=self.mipmap,
+            )
+            cached_arrays = self.cache.load(cache_key)
+            if cached_arrays is not None:
+                self._lookup_table = load_lookup_table(cached_arrays)
+                self.from_cache = True
+                return self
+
+        table_class = LookupTable
+        if self.adaptive:
+            table_class = AdaptiveLookupTable
+        elif self.mipmap:
+            table_class = MipmapLookupTable
+        self._lookup_table = table_class.build(self.sampler, self.filter_name, self.samples, self.sample_kernel)
+        if self.cache is not None:
+            self.cache.store(cache_key, self._lookup_table.arrays())
+        return self
+
+    def _as_buffer(self, image: Union[np.ndarray, Image.Image]) -> np.ndarray:
+        input_buffer = np.asarray(image)
+        if input_buffer.shape[1::-1] != self.input_size:
+            raise ValueError(
+                f'Expected {self.input_size[0]}x{self.input_size[1]} input, '
+                f'got {input_buffer.shape[1]}x{input_buffer.shape[0]}'
+            )
+        if input_buffer.ndim == 2:
+            input_buffer = input_buffer[:, :, np.newaxis]
+        return input_buffer
+
+    def project(self, image: Union[np.ndarray, Image.Image], out: Optional[np.ndarray] = None) -> np.ndarray:
+        # Project an image given as PIL image or array of shape
+        # (height, width) or (height, width, channels). Returns an array
+        # of the same dtype and number of dimensions.
+        image = np.asarray(image)
+        single_channel = image.ndim == 2
+        input_buffer = self._as_buffer(image)
+        if out is not None and single_channel:
+            out = out[:, :, np.newaxis]
+        output_buffer = self.lookup_table.apply(input_buffer, out=out)
+        return output_buffer[:, :, 0] if single_channel else output_buffer
+
+    def project_tiled(self, image: Union[np.ndarray, Image.Image], out: np.ndarray, tile_size: int) -> np.ndarray:
+        # Like project, but tile by tile without compiling the whole lookup
+        # table. Only reads the input regions needed, so image can be a
+        # memory-mapped array too.
+        if self.mipmap:
+            raise ValueError('Mip-mapping needs the whole input and does not support tiled rendering')
+        input_buffer = self._as_buffer(image)
+        render_tiled(
+            self.sampler,
+            input_buffer,
+            out if out.ndim == 3 else out[:, :, np.newaxis],
+            tile_size,
+            self.filter_name,
+            self.samples,
+            self.sample_kernel,
+            self.adaptive,
+        )
+        return out
@@ -0,0 +1,120 @@
+import json
+import os
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, Optional
+
+import numpy as np
+import profiling
+from image_io import write_image
+from projections.base import Projection
+from projections.cubemap import CubemapProjection
+
+
+def downsample(image: np.ndarray, wrap_x: bool = False) -> np.ndarray:
+    # Half the size of an image of shape (height, width, channels) by
+    # averaging 2x2 blocks. An odd last row is repeated, an odd last column
+    # is repeated too, or continued from the left edge if wrap_x is set.
+    height, width = image.shape[:2]
+    if height % 2:
+        image = np.pad(image, ((0, 1), (0, 0), (0, 0)), mode='edge')
+    if width % 2:
+        image = np.pad(image, ((0, 0), (0, 1), (0, 0)), mode='wrap' if wrap_x else 'edge')
+    # Sum pairs of rows, then pairs of columns, which is much faster than
+    # reducing over reshaped block axes
+    rows = np.add(image[0::2], image[1::2], dtype=np.float32)
+    downsampled = np.add(rows[:, 0::2], rows[:, 1::2])
+    downsampled *= 0.25
+    if np.issubdtype(image.dtype, np.integer):
+        limits = np.iinfo(image.dtype)
+        downsampled = np.clip(np.rint(downsampled, out=downsampled), limits.min, limits.max, out=downsampled)
+    return downsampled.astype(image.dtype)
+
+
+def level_count(size: int, tile_size: int) -> int:
+    # Number of levels, halving the size until it fits into a single tile
+    levels = 1
+    while size > tile_size:
+        size = -(-size // 2)
+        levels += 1
+    return levels
+
+
+def pyramid_images(output_buffer: np.ndarray, output_projection: Projection) -> Dict[Optional[str], np.ndarray]:
+    # The separately tiled images of a projected output buffer:
+    # The six faces of a cube map, or the whole image otherwise
+    if isinstance(output_projection, CubemapProjection):
+        out_height, out_width = output_buffer.shape[:2]
+        return {
+            face.name: output_buffer[y_start:y_end, x_start:x_end]
+            for face, (x_start, y_start, x_end, y_end) in output_projection.face_regions(out_width, out_height).items()
+        }
+    return {None: output_buffer}
+
+
+def _save_tile(tile: np.ndarray, path: str):
+    with profiling.stage('encode', path=path):
+        write_image(path, tile)
+    if profiling.enabled:
+        profiling.count('bytes_written', os.path.getsize(path))
+
+
+def write_pyramid(
+    output_buffer: np.ndarray,
+    output_projection: Projection,
+    projection_name: str,
+    directory: str,
+    tile_size: int = 512,
+    levels: Optional[int] = None,
+    tile_format: str = 'jpg',
+    workers: int = 4,
+) -> dict:
+    # Cut a projected image into a multi-resolution tile pyramid for
+    # panorama viewers. Only the finest level is projected, coarser levels
+    # are downsampled from it. Tiles are written to
+    # <directory>/<level size>/[<face>/]<row>_<column>.<tile_format>,
+    # the level size being the face size of cube maps and the image width
+    # otherwise. Encoding and writing the tiles runs in a thread pool.
+    # Also writes and returns a pyramid.json manifest.
+    if output_buffer.ndim == 2:
+        output_buffer = output_buffer[:, :, np.newaxis]
+    images = pyramid_images(output_buffer, output_projection)
+
+    finest_size = next(iter(images.values())).shape[1]
+    if levels is None:
+        levels = level_count(finest_size, tile_size)
+    wrap_x = not isinstance(output_projection, CubemapProjection)
+
+    level_sizes: List[dict] = []
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        pending = []
+        for level in range(levels):
+            for name, image in images.items():
+                level_height, level_width = image.shape[:2]
+                level_directory = os.path.join(directory, str(level_width), *([name] if name else []))
+                os.makedirs(level_directory, exist_ok=True)
+                for row, y_start in enumerate(range(0, level_height, tile_size)):
+                    for column, x_start in enumerate(range(0, level_width, tile_size)):
+                        tile = image[y_start:y_start + tile_size, x_start:x_start + tile_size]
+                        tile_path = os.path.join(level_directory, f'{row}_{column}.{tile_format}')
+                        pending.append(executor.submit(_save_tile, tile, tile_path))
+            level_sizes.append({'width': level_width, 'height': level_height})
+
+            if level + 1 < levels:
+                # Pending tiles keep referencing the current level
+                with profiling.stage('downsample', level=level + 1):
+                    images = {name: downsample(image, wrap_x) for name, image in images.items()}
+
+        for future in pending:
+            # Propagate errors of the writer threads
+            future.result()
+
+    manifest = {
+        'projection': projection_name,
+        'tile_size': tile_size,
+        'format': tile_format,
+        'faces': [name for name in images if name is not None],
+        'levels': level_sizes[::-1],
+    }
+    with open(os.path.join(directory, 'pyramid.json'), 'w') as f:
+        json.dump(manifest, f, indent=2)
+    return manifest
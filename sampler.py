@@ -1,62 +1,212 @@
-from typing import Tuple, Callable
+from typing import List, Tuple, Optional
 
+import numpy as np
 from settings import Settings
-from projections.base import Point
+from filters import filter_taps
+from projections.direct import find_direct_mapping
+from projections.utils import Rotation
+
+
+def _parse_values(text: str, count: int) -> List[float]:
+    # count comma-separated numbers, raising ValueError otherwise
+    values = text.split(',')
+    try:
+        if len(values) == count:
+            return [float(value) for value in values]
+    except ValueError:
+        pass
+    raise ValueError(f'Expected {count} comma-separated numbers, got {text!r}')
+
+
+def parse_rotation(angles: Optional[str], quaternion: Optional[str]) -> Optional[Rotation]:
+    # Rotation from the "<x>,<y>,<z>" (degrees) and "<w>,<x>,<y>,<z>" CLI arguments.
+    # If both are given, the angles are applied first.
+    rotation = None
+    if angles:
+        rotation = Rotation.from_angles(*_parse_values(angles, 3))
+    if quaternion:
+        quaternion_rotation = Rotation.from_quaternion(*_parse_values(quaternion, 4))
+        rotation = rotation.then(quaternion_rotation) if rotation else quaternion_rotation
+    return rotation
 
 
 class Sampler:
-    def __init__(self, cli_args, settings: Settings, sampling_callback: Callable):
-        self.cli_args = cli_args
+    def __init__(
+        self,
+        settings: Settings,
+        rotation: Optional[Rotation] = None,
+        use_direct_mappings: bool = True,
+    ):
         self.settings = settings
-        self.sampling_callback = sampling_callback
-
-        if self.cli_args.rotation:
-            angle_x, angle_y, angle_z = self.cli_args.rotation.split(',')
-            self.rotation_angles = int(angle_x), int(angle_y), int(angle_z)
-        else:
-            self.rotation_angles = None
-
-    def _get_sample(self, point: Point) -> Tuple[int, int, int]:
-        direction = self.settings.output_projection.to_direction(point)
-        if not direction:
-            # Projection gaps may exist -> Return black
-            return 0, 0, 0
-
-        if self.rotation_angles:
-            direction = direction.rotated(*self.rotation_angles)
-
-        input_point = self.settings.input_projection.to_point(direction)
-        if not input_point:
-            return 0, 0, 0
-
-        return self.sampling_callback(
-            in_x=int(input_point.x * (self.settings.in_width - 1)),
-            in_y=int(input_point.y * (self.settings.in_height - 1)),
-        )
+        self.rotation = rotation
+        self.direct_mapping = None
+        if use_direct_mappings:
+            self.direct_mapping = find_direct_mapping(settings.output_projection, settings.input_projection)
 
-    def get_supersample(self, out_x: int, out_y: int, samples: int = 1) -> Tuple[int, int, int]:
-        if samples == 1:
-            # One sample per pixel
-            output_point = Point(
-                out_x / self.settings.out_width,
-                out_y / self.settings.out_height
-            )
-            return self._get_sample(output_point)
-        else:
-            # Super-sampling (slow, even if args.samples==1)
-            r, g, b = 0, 0, 0
-            for y_sample in range(self.cli_args.samples):
-                for x_sample in range(self.cli_args.samples):
-                    output_point = Point(
-                        (out_x + x_sample/self.cli_args.samples) / self.settings.out_width,
-                        (out_y + y_sample/self.cli_args.samples) / self.settings.out_height
-                    )
-                    sample = self._get_sample(output_point)
-                    r += sample[0]
-                    g += sample[1]
-                    b += sample[2]
-            return (
-                r // samples * samples,
-                g // samples * samples,
-                b // samples * samples
+    def get_source_positions(self, xs: np.ndarray, ys: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Maps arrays of normalized output coordinates to continuous input
+        # pixel positions. The returned mask is False where the output pixel
+        # has no source, e.g. in projection gaps.
+        mapped = None
+        if self.direct_mapping:
+            mapped = self.direct_mapping(
+                self.settings.output_projection,
+                self.settings.input_projection,
+                xs,
+                ys,
+                self.rotation,
             )
+
+        if mapped is None:
+            # Generic path via direction vectors
+            return self.get_source_positions_of_directions(*self.settings.output_projection.to_directions(xs, ys))
+
+        in_xs, in_ys, valid = mapped
+        return self._scaled_to_input(in_xs, in_ys, valid)
+
+    def get_source_positions_of_directions(
+        self,
+        directions: np.ndarray,
+        valid: np.ndarray,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Like get_source_positions, for output directions (before rotation)
+        # which have already been computed, see sequence.DirectionField
+        if self.rotation:
+            directions = self.rotation.apply(directions)
+
+        in_xs, in_ys, in_valid = self.settings.input_projection.to_points(directions)
+        return self._scaled_to_input(in_xs, in_ys, valid & in_valid)
+
+    def _scaled_to_input(
+        self,
+        in_xs: np.ndarray,
+        in_ys: np.ndarray,
+        valid: np.ndarray,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Normalized input coordinates to pixel positions, zero outside of valid
+        in_xs = np.where(valid, in_xs * (self.settings.in_width - 1), 0)
+        in_ys = np.where(valid, in_ys * (self.settings.in_height - 1), 0)
+        return in_xs, in_ys, valid
+
+    def get_source_coordinates(self, xs: np.ndarray, ys: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Like get_source_positions, but truncated to input pixel indices
+        in_xs, in_ys, valid = self.get_source_positions(xs, ys)
+        return in_xs.astype(np.int64), in_ys.astype(np.int64), valid
+
+    def get_filter_taps(
+        self,
+        xs: np.ndarray,
+        ys: np.ndarray,
+        filter_name: str = 'nearest',
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Input pixel indices and weights of all filter taps contributing
+        # to the given output coordinates, each of shape xs.shape + (K,).
+        # Weights are zero where the output falls into a projection gap.
+        return self.get_filter_taps_at(*self.get_source_positions(xs, ys), filter_name)
+
+    def get_filter_taps_at(
+        self,
+        in_xs: np.ndarray,
+        in_ys: np.ndarray,
+        valid: np.ndarray,
+        filter_name: str = 'nearest',
+        size: Optional[Tuple[int, int]] = None,
+        centers: Optional[Tuple[np.ndarray, np.ndarray]] = None,
+    ) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Like get_filter_taps, for source positions as returned by
+        # get_source_positions. size is the (width, height) of the sampled
+        # image if it is not the input image, e.g. a level of a mip pyramid.
+        # Taps are kept in the part of the scene of the center pixels, by
+        # default the pixels containing the positions.
+        width, height = size or (self.settings.in_width, self.settings.in_height)
+        center_xs, center_ys = centers or (in_xs.astype(np.int64), in_ys.astype(np.int64))
+        tap_xs, weights_x = filter_taps(filter_name, in_xs)
+        tap_ys, weights_y = filter_taps(filter_name, in_ys)
+
+        # Combine the separable x and y taps into K = Ky * Kx taps
+        grid_shape = in_xs.shape + (tap_ys.shape[-1], tap_xs.shape[-1])
+        taps_shape = in_xs.shape + (-1,)
+        tap_xs = np.broadcast_to(tap_xs[..., np.newaxis, :], grid_shape).reshape(taps_shape)
+        tap_ys = np.broadcast_to(tap_ys[..., :, np.newaxis], grid_shape).reshape(taps_shape)
+        weights = (weights_y[..., :, np.newaxis] * weights_x[..., np.newaxis, :]).reshape(taps_shape)
+        weights *= valid[..., np.newaxis]
+
+        tap_xs, tap_ys = self.settings.input_projection.clamp_taps(
+            tap_xs,
+            tap_ys,
+            center_xs,
+            center_ys,
+            width,
+            height,
+        )
+        return tap_xs, tap_ys, weights
+
+    def get_source_footprint_axes(self, xs: np.ndarray, ys: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        # Extent of the footprint of each output pixel in the input image
+        # along the output x and y axes, in input pixels, for a grid of
+        # output coordinates as returned by get_output_grid: The distances
+        # between the source positions of horizontally and vertically
+        # neighbouring pixels. Of the two neighbours along an axis, the
+        # closer one counts, so that seams of the input projection (e.g. the
+        # azimuth wrap) are not mistaken for large footprints. Pixels without
+        # valid neighbours along an axis get an extent of one.
+        in_xs, in_ys, valid = self.get_source_positions(xs, ys)
+
+        def neighbour_distance(axis: int) -> np.ndarray:
+            distance = np.hypot(np.diff(in_xs, axis=axis), np.diff(in_ys, axis=axis))
+            both_valid = np.take(valid, range(1, valid.shape[axis]), axis=axis) & \
+                np.take(valid, range(valid.shape[axis] - 1), axis=axis)
+            distance = np.where(both_valid, distance, np.inf)
+            padding = [(0, 0), (0, 0)]
+            padding[axis] = (1, 0)
+            previous = np.pad(distance, padding, constant_values=np.inf)
+            padding[axis] = (0, 1)
+            following = np.pad(distance, padding, constant_values=np.inf)
+            distance = np.minimum(previous, following)
+            return np.where(np.isfinite(distance), distance, 1.0)
+
+        return neighbour_distance(1), neighbour_distance(0)
+
+    def get_region_footprint_axes(
+        self,
+        x_start: int = 0,
+        y_start: int = 0,
+        x_end: Optional[int] = None,
+        y_end: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # get_source_footprint_axes of the output pixels in the given region
+        # (whole image by default). The neighbours just outside of the region
+        # count as well, so that footprints do not depend on how the output
+        # is split into tiles.
+        x_end = self.settings.out_width if x_end is None else x_end
+        y_end = self.settings.out_height if y_end is None else y_end
+        margin_x_start, margin_y_start = max(x_start - 1, 0), max(y_start - 1, 0)
+        footprint_x, footprint_y = self.get_source_footprint_axes(*self.get_output_grid(
+            margin_x_start,
+            margin_y_start,
+            min(x_end + 1, self.settings.out_width),
+            min(y_end + 1, self.settings.out_height),
+        ))
+        rows = slice(y_start - margin_y_start, y_end - margin_y_start)
+        columns = slice(x_start - margin_x_start, x_end - margin_x_start)
+        return footprint_x[rows, columns], footprint_y[rows, columns]
+
+    def get_output_grid(
+        self,
+        x_start: int = 0,
+        y_start: int = 0,
+        x_end: Optional[int] = None,
+        y_end: Optional[int] = None,
+    ) -> Tuple[np.ndarray, np.ndarray]:
+        # Normalized coordinates of the output pixels in the given region
+        # (whole image by default), of shape (region height, region width)
+        x_end = self.settings.out_width if x_end is None else x_end
+        y_end = self.settings.out_height if y_end is None else y_end
+        xs = np.arange(x_start, x_end) / self.settings.out_width
+        ys = np.arange(y_start, y_end) / self.settings.out_height
+        return np.meshgrid(xs, ys)
+
+    def get_mapping(self) -> Tuple[np.ndarray, np.ndarray, np.ndarray]:
+        # Input pixel coordinates for the whole output frame, one sample per
+        # pixel. All arrays have shape (out_height, out_width).
+        return self.get_source_coordinates(*self.get_output_grid())
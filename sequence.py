@@ -0,0 +1,111 @@
+from bisect import bisect_right
+from concurrent.futures import ThreadPoolExecutor
+from typing import Iterator, List, Optional, Tuple
+
+import numpy as np
+
+import profiling
+from filters import subpixel_offsets
+from lookup_table import LookupTable
+from projections.utils import Rotation
+from sampler import Sampler, parse_rotation
+from settings import Settings
+
+
+def parse_keyframes(lines) -> List[Tuple[int, Rotation]]:
+    # Keyframes given as lines "<frame> <x>,<y>,<z>" (angles in degrees) or
+    # "<frame> <w>,<x>,<y>,<z>" (unit quaternion). Empty lines and lines
+    # starting with # are skipped. Returns the keyframes sorted by frame.
+    keyframes = []
+    for line in lines:
+        line = line.strip()
+        if not line or line.startswith('#'):
+            continue
+        frame, values = line.split()
+        if len(values.split(',')) == 4:
+            rotation = parse_rotation(None, values)
+        else:
+            rotation = parse_rotation(values, None)
+        keyframes.append((int(frame), rotation))
+    if not keyframes:
+        raise ValueError('No keyframes given')
+    return sorted(keyframes, key=lambda keyframe: keyframe[0])
+
+
+def interpolate_keyframes(keyframes: List[Tuple[int, Rotation]], frame_count: int) -> List[Rotation]:
+    # Rotation of every frame, interpolated spherically between the
+    # keyframes. Frames before the first or after the last keyframe
+    # keep its rotation.
+    keyframe_indices = [frame for frame, _ in keyframes]
+    rotations = []
+    for frame in range(frame_count):
+        index = bisect_right(keyframe_indices, frame)
+        if index == 0:
+            rotations.append(keyframes[0][1])
+        elif index == len(keyframes):
+            rotations.append(keyframes[-1][1])
+        else:
+            (previous_frame, previous_rotation), (next_frame, next_rotation) = keyframes[index - 1:index + 1]
+            t = (frame - previous_frame) / (next_frame - previous_frame)
+            rotations.append(previous_rotation.interpolate(next_rotation, t))
+    return rotations
+
+
+class DirectionField:
+    """
+    Output directions of all super-samples of all output pixels.
+
+    For a sequence of rotations of the same conversion, the output
+    projection is only evaluated once. Each frame then only rotates the
+    directions and maps them to the input projection.
+    """
+
+    def __init__(self, settings: Settings, samples: int = 1, kernel: str = 'box'):
+        self.settings = settings
+        sampler = Sampler(settings)
+        xs, ys = sampler.get_output_grid()
+        # (directions, valid, sub-sample weight) per sub-sample
+        self.samples = []
+        with profiling.stage('direction_field', samples=samples):
+            for offset_x, offset_y, sample_weight in zip(*subpixel_offsets(samples, kernel)):
+                directions, valid = settings.output_projection.to_directions(
+                    xs + offset_x / settings.out_width,
+                    ys + offset_y / settings.out_height,
+                )
+                self.samples.append((directions, valid, sample_weight))
+
+    def lookup_table(self, rotation: Optional[Rotation], filter_name: str = 'nearest') -> LookupTable:
+        with profiling.stage('build_table', filter=filter_name):
+            sampler = Sampler(self.settings, rotation)
+            sample_taps = []
+            for directions, valid, sample_weight in self.samples:
+                tap_xs, tap_ys, weights = sampler.get_filter_taps_at(
+                    *sampler.get_source_positions_of_directions(directions, valid),
+                    filter_name,
+                )
+                sample_taps.append((tap_xs, tap_ys, weights * sample_weight))
+            return LookupTable.from_sample_taps(sample_taps, (self.settings.in_width, self.settings.in_height))
+
+
+def render_sequence(
+    input_buffer: np.ndarray,
+    direction_field: DirectionField,
+    rotations: List[Optional[Rotation]],
+    filter_name: str = 'nearest',
+    workers: int = 1,
+) -> Iterator[np.ndarray]:
+    # Yield the input buffer of shape (height, width, channels) projected
+    # with each rotation, in order. Frames are rendered by a pool of worker
+    # threads sharing the direction field; at most 2 * workers frames are
+    # in flight.
+    def render_frame(rotation):
+        return direction_field.lookup_table(rotation, filter_name).apply(input_buffer)
+
+    with ThreadPoolExecutor(max(workers, 1)) as executor:
+        pending = []
+        for rotation in rotations:
+            pending.append(executor.submit(render_frame, rotation))
+            if len(pending) >= 2 * max(workers, 1):
+                yield pending.pop(0).result()
+        for future in pending:
+            yield future.result()
@@ -1,34 +1,53 @@
-import sys
+from typing import Optional, Tuple
 from projections.map import projections_map
 
 
+class ProjectionDetectionError(ValueError):
+    # The input projection is 'auto', and no projection has the aspect
+    # ratio of the input image
+    pass
+
+
 class Settings(dict):
-    def __init__(self, cli_args, input_image, *args, **kwargs):
+    def __init__(
+        self,
+        in_projection: str,
+        out_projection: str,
+        input_size: Tuple[int, int],
+        out_width: Optional[int] = None,
+        out_height: Optional[int] = None,
+        hemi_fov_x: int = 180,
+        hemi_fov_y: int = 180,
+        *args,
+        **kwargs
+    ):
         super().__init__(*args, **kwargs)
 
-        in_projection = cli_args.in_projection
-        self.in_width, self.in_height = input_image.size
+        self.in_width, self.in_height = input_size
         in_aspect_ratio = float(self.in_width) / float(self.in_height)
         if in_projection == 'auto':
             # Detect input projection based on image aspect ratio
             for projection_name, projection_class in projections_map.items():
                 if projection_class.aspect_ratio() == in_aspect_ratio:
                     in_projection = projection_name
-            # No match found, ask the user to specify projection
+            # No match found, the caller has to specify the projection
             if in_projection == 'auto':
-                print('Specify input projection using --in-projection')
-                sys.exit(0)
+                raise ProjectionDetectionError(f'Cannot detect projection of {self.in_width}x{self.in_height} input')
 
+        self.hemi_fov_x = hemi_fov_x
+        self.hemi_fov_y = hemi_fov_y
         projection_kwargs = {
-            'hemi_fov_x': cli_args.hemi_fov_x,
-            'hemi_fov_y': cli_args.hemi_fov_y,
+            'hemi_fov_x': hemi_fov_x,
+            'hemi_fov_y': hemi_fov_y,
         }
 
+        self.in_projection_name = in_projection
+        self.out_projection_name = out_projection
         self.input_projection = projections_map[in_projection](**projection_kwargs)
-        self.output_projection = projections_map[cli_args.out_projection](**projection_kwargs)
+        self.output_projection = projections_map[out_projection](**projection_kwargs)
 
-        self.out_width = cli_args.width
-        self.out_height = cli_args.height
+        self.out_width = out_width
+        self.out_height = out_height
         if not self.out_width or not self.out_height:
             # Come up with reasonable output image size based on
             # input image size and desired output projection
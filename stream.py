@@ -0,0 +1,96 @@
+import threading
+from queue import Queue
+from typing import BinaryIO
+
+import numpy as np
+
+import profiling
+from lookup_table import LookupTable
+
+
+def _read_frame(input_stream: BinaryIO, frame: np.ndarray) -> bool:
+    # Fill frame from the stream. Returns False at the end of the stream.
+    view = memoryview(frame).cast('B')
+    position = 0
+    while position < len(view):
+        count = input_stream.readinto(view[position:])
+        if not count:
+            if position == 0:
+                return False
+            raise EOFError(f'Incomplete frame: Got {position} of {len(view)} bytes')
+        position += count
+    return True
+
+
+def stream_frames(
+    input_stream: BinaryIO,
+    output_stream: BinaryIO,
+    lookup_table: LookupTable,
+    in_width: int,
+    in_height: int,
+    channels: int = 3,
+    dtype='uint8',
+    queue_depth: int = 2,
+) -> int:
+    # Remap raw interleaved frames from input_stream to output_stream.
+    # Reading and writing happen in background threads. Frames are passed
+    # through bounded queues of preallocated buffers, so memory stays at
+    # queue_depth input and output frames. Returns the number of frames.
+    out_height, out_width = lookup_table.shape
+    free_input_frames = Queue()
+    free_output_frames = Queue()
+    for _ in range(queue_depth):
+        free_input_frames.put(np.empty((in_height, in_width, channels), dtype=dtype))
+        free_output_frames.put(np.empty((out_height, out_width, channels), dtype=dtype))
+    read_frames = Queue()
+    remapped_frames = Queue()
+    errors = []
+
+    def read():
+        try:
+            while True:
+                frame = free_input_frames.get()
+                with profiling.stage('read_frame'):
+                    if not _read_frame(input_stream, frame):
+                        break
+                profiling.count('bytes_read', frame.nbytes)
+                read_frames.put(frame)
+        except Exception as error:
+            errors.append(error)
+        read_frames.put(None)
+
+    def write():
+        while True:
+            frame = remapped_frames.get()
+            if frame is None:
+                break
+            try:
+                with profiling.stage('write_frame'):
+                    output_stream.write(memoryview(frame).cast('B'))
+                profiling.count('bytes_written', frame.nbytes)
+            except Exception as error:
+                errors.append(error)
+            free_output_frames.put(frame)
+        output_stream.flush()
+
+    reader = threading.Thread(target=read, daemon=True)
+    writer = threading.Thread(target=write)
+    reader.start()
+    writer.start()
+
+    frame_count = 0
+    while not errors:
+        input_frame = read_frames.get()
+        if input_frame is None:
+            break
+        output_frame = free_output_frames.get()
+        lookup_table.apply(input_frame, out=output_frame)
+        free_input_frames.put(input_frame)
+        remapped_frames.put(output_frame)
+        frame_count += 1
+
+    remapped_frames.put(None)
+    writer.join()
+    if errors:
+        raise errors[0]
+    return frame_count
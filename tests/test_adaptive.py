@@ -0,0 +1,54 @@
+import numpy as np
+import pytest
+
+from projector import Projector
+
+IN_WIDTH, IN_HEIGHT = 1024, 512
+# Gratings (x period, y period) of 2.2 to 3 input pixels, finer than any
+# output pixel of the cases below spans. Sampled properly, the outputs are
+# a flat grey, any pattern left is aliasing.
+GRATINGS = [(2.6, 7.1), (-3.3, 2.9), (9.0, -2.4), (3.0, np.inf), (np.inf, 2.7)]
+# Downscaling conversions: (output projection, output width)
+CASES = [('cubemap', 512), ('hemispherical', 128)]
+
+
+def grating_image():
+    ys, xs = np.mgrid[0:IN_HEIGHT, 0:IN_WIDTH]
+    image = sum(np.sin(2 * np.pi * (xs / period_x + ys / period_y)) for period_x, period_y in GRATINGS)
+    return np.clip(127.5 + 127.5 * image / 3, 0, 255).astype(np.uint8)[:, :, None]
+
+
+def box_blur(image, radius=3):
+    size = 2 * radius + 1
+    for axis in (0, 1):
+        padding = [(0, 0)] * image.ndim
+        padding[axis] = (radius + 1, radius)
+        sums = np.cumsum(np.pad(image.astype(float), padding, mode='edge'), axis=axis)
+        image = (np.take(sums, range(size, sums.shape[axis]), axis=axis) - np.take(sums, range(sums.shape[axis] - size), axis=axis)) / size
+    return image
+
+
+def aliasing(projector, image):
+    # Mean deviation of the low frequencies of the output from flat grey,
+    # away from projection gaps
+    valid = projector.lookup_table.valid
+    interior = box_blur(box_blur(valid[:, :, None].astype(float)))[:, :, 0] > 0.999
+    output = box_blur(box_blur(projector.project(image)))
+    return np.abs(output[interior & valid] - image.mean()).mean()
+
+
+@pytest.mark.parametrize('out_projection,out_width', CASES)
+def test_adaptive_samples_alias_less_at_equal_cost(out_projection, out_width):
+    image = grating_image()
+
+    def projector(**options):
+        projector = Projector(out_projection, (IN_WIDTH, IN_HEIGHT), 'equirectangular', out_width=out_width, filter_name='bilinear', **options)
+        projector.compile()
+        return projector
+
+    adaptive = projector(samples=8, adaptive=True)
+    # The cheapest uniform super-sampling costing at least as many taps
+    samples = 1
+    while projector(samples=samples).lookup_table.taps < adaptive.lookup_table.average_taps:
+        samples += 1
+    assert aliasing(adaptive, image) < aliasing(projector(samples=samples), image)
@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from analysis import round_trip_error, summary
+from projections.map import projections_map
+
+WIDTH, HEIGHT = 512, 384
+
+
+@pytest.mark.parametrize('projection_name', list(projections_map))
+def test_round_trip_is_exact(projection_name):
+    projection = projections_map[projection_name]()
+    errors = summary(round_trip_error(projection, WIDTH, HEIGHT))
+    # Directions exactly on cube edges are mapped to the neighbouring
+    # cell of the layout, which only affects single rows and columns
+    assert errors['nonzero_fraction'] < 0.005
+
+
+@pytest.mark.parametrize('projection_name', list(projections_map))
+def test_round_trip_detects_shift(projection_name):
+    # A to_points which is off by 3 pixels horizontally
+    projection = projections_map[projection_name]()
+    to_points = projection.to_points
+
+    def shifted_to_points(vectors):
+        xs, ys, valid = to_points(vectors)
+        return xs + 3.0 / WIDTH, ys, valid
+
+    projection.to_points = shifted_to_points
+    errors = round_trip_error(projection, WIDTH, HEIGHT)
+    valid_errors = errors[np.isfinite(errors)]
+    assert len(valid_errors)
+    assert np.mean(np.isclose(valid_errors, 3.0, atol=1e-3)) > 0.95
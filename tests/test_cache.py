@@ -0,0 +1,85 @@
+import os
+
+import numpy as np
+
+from cache import LookupTableCache
+
+
+def table(value):
+    return {'indices': np.full(1000, value, dtype=np.uint32), 'shape': np.array([10, 100])}
+
+
+def directory_size(directory):
+    return sum(os.path.getsize(os.path.join(directory, name)) for name in os.listdir(directory))
+
+
+def table_size(tmp_path):
+    # Bytes of one stored table, manifest included
+    directory = str(tmp_path / 'size')
+    LookupTableCache(directory, 1 << 30).store('key', table(0))
+    return directory_size(directory)
+
+
+def set_last_used(cache, key, time):
+    os.utime(cache._manifest_path(key), (time, time))
+
+
+def test_round_trip(tmp_path):
+    cache = LookupTableCache(str(tmp_path), 1 << 30)
+    cache.store('a', table(1))
+    arrays = cache.load('a')
+    assert set(arrays) == {'indices', 'shape'}
+    assert np.array_equal(arrays['indices'], table(1)['indices'])
+    assert cache.load('b') is None
+
+
+def test_least_recently_used_table_is_evicted(tmp_path):
+    cache = LookupTableCache(str(tmp_path / 'cache'), 3 * table_size(tmp_path))
+    for time, key in enumerate('abc'):
+        cache.store(key, table(time))
+        set_last_used(cache, key, 1000 + time)
+    # Loading marks a as used most recently, leaving b the oldest
+    assert cache.load('a') is not None
+    cache.store('d', table(3))
+    assert cache.load('b') is None
+    for key in 'acd':
+        assert cache.load(key) is not None
+
+
+def test_size_stays_within_bound(tmp_path):
+    max_size = 3 * table_size(tmp_path) + 100
+    cache = LookupTableCache(str(tmp_path / 'cache'), max_size)
+    for time in range(10):
+        cache.store(str(time), table(time))
+        set_last_used(cache, str(time), 1000 + time)
+        assert directory_size(cache.directory) <= max_size
+    # The most recent tables are kept
+    assert [key for key in map(str, range(10)) if cache.load(key) is not None] == ['7', '8', '9']
+
+
+def test_oversized_table_is_kept(tmp_path):
+    cache = LookupTableCache(str(tmp_path / 'cache'), table_size(tmp_path) // 2)
+    cache.store('a', table(1))
+    assert np.array_equal(cache.load('a')['indices'], table(1)['indices'])
+    # It is evicted by the next table, which is kept in turn
+    set_last_used(cache, 'a', 1000)
+    cache.store('b', table(2))
+    assert cache.load('a') is None
+    assert np.array_equal(cache.load('b')['indices'], table(2)['indices'])
+
+
+def test_load_without_manifest_misses(tmp_path):
+    cache = LookupTableCache(str(tmp_path), 1 << 30)
+    cache.store('a', table(1))
+    os.remove(cache._manifest_path('a'))
+    assert cache.load('a') is None
+    # Storing again repairs the table
+    cache.store('a', table(2))
+    assert np.array_equal(cache.load('a')['indices'], table(2)['indices'])
+
+
+def test_load_with_missing_array_misses(tmp_path):
+    cache = LookupTableCache(str(tmp_path), 1 << 30)
+    cache.store('a', table(1))
+    os.remove(cache._array_path('a', 'indices'))
+    assert cache.load('a') is None
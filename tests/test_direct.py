@@ -0,0 +1,124 @@
+import numpy as np
+import pytest
+
+from projections.direct import direct_mappings, find_direct_mapping
+from projections.map import projections_map
+from sampler import Sampler, parse_rotation
+from settings import Settings
+
+OUT_WIDTH = 512
+# Angles of a general rotation, and of a rotation around the vertical axis
+ROTATIONS = [None, '10,20,30', '0,40,0']
+# Largest allowed distance between the positions of both paths, in pixels
+TOLERANCE = 0.01
+
+
+def input_size(projection_name):
+    width = 1024
+    return width, int(width / projections_map[projection_name].aspect_ratio())
+
+
+def mapped_cases():
+    # (output projection, input projection, rotation) of all conversions
+    # which have a direct mapping
+    cases = []
+    for out_name in projections_map:
+        for in_name in projections_map:
+            if find_direct_mapping(projections_map[out_name](), projections_map[in_name]()):
+                cases.extend((out_name, in_name, rotation) for rotation in ROTATIONS)
+    return cases
+
+
+def kernel_handles(out_name, in_name, rotation_angles):
+    # Whether the direct mapping handles the conversion, e.g. kernels for
+    # identical projections decline rotations. Checked on a small output.
+    settings = Settings(in_name, out_name, input_size(in_name), out_width=12)
+    sampler = Sampler(settings, parse_rotation(rotation_angles, None))
+    xs, ys = sampler.get_output_grid()
+    return sampler.direct_mapping(settings.output_projection, settings.input_projection, xs, ys, sampler.rotation) is not None
+
+
+def direct_cases():
+    # Cases which the direct mappings handle
+    return [case for case in mapped_cases() if kernel_handles(*case)]
+
+
+def declined_cases():
+    # Cases with a direct mapping which falls back to the generic path
+    return [case for case in mapped_cases() if not kernel_handles(*case)]
+
+
+def both_paths(out_name, in_name, rotation_angles):
+    # Source positions of the output grid via the direct mapping and via
+    # the generic direction vectors, or None if the kernel declines
+    settings = Settings(in_name, out_name, input_size(in_name), out_width=OUT_WIDTH)
+    rotation = parse_rotation(rotation_angles, None)
+    direct = Sampler(settings, rotation)
+    generic = Sampler(settings, rotation, use_direct_mappings=False)
+    xs, ys = direct.get_output_grid()
+    if direct.direct_mapping(settings.output_projection, settings.input_projection, xs, ys, rotation) is None:
+        return None
+    return settings, xs, ys, direct.get_source_positions(xs, ys), generic.get_source_positions(xs, ys)
+
+
+def on_cube_edge(directions):
+    # Directions with two components of the largest magnitude, which lie on
+    # the edge of two cube faces
+    magnitudes = np.sort(np.abs(directions), axis=-1)
+    return np.isclose(magnitudes[..., 1], magnitudes[..., 2], rtol=0, atol=1e-12)
+
+
+def test_all_kernels_are_covered():
+    covered = set()
+    for out_name, in_name, _ in direct_cases():
+        covered.add(find_direct_mapping(projections_map[out_name](), projections_map[in_name]()))
+    assert covered == set(direct_mappings.values())
+
+
+@pytest.mark.parametrize('out_name,in_name,rotation', declined_cases())
+def test_declined_cases_fall_back_to_generic_path(out_name, in_name, rotation):
+    assert both_paths(out_name, in_name, rotation) is None
+    # Only conversions between different cube map layouts, and rotated
+    # conversions between identical projections other than equirectangular
+    # yaw, are declined
+    if out_name == in_name:
+        assert rotation is not None and (in_name, rotation) != ('equirectangular', '0,40,0')
+    else:
+        assert out_name.startswith('cubemap') and in_name.startswith('cubemap')
+
+
+@pytest.mark.parametrize('out_name,in_name,rotation', direct_cases())
+def test_direct_mapping_matches_generic_path(out_name, in_name, rotation):
+    paths = both_paths(out_name, in_name, rotation)
+    assert paths is not None
+    settings, xs, ys, (direct_xs, direct_ys, direct_valid), (generic_xs, generic_ys, generic_valid) = paths
+
+    distance_x = np.abs(direct_xs - generic_xs)
+    if in_name == 'equirectangular':
+        # The left and right image edges are the same azimuth
+        distance_x = np.minimum(distance_x, settings.in_width - 1 - distance_x)
+    distance = np.hypot(distance_x, direct_ys - generic_ys)
+    differs = (distance > TOLERANCE) & direct_valid & generic_valid
+
+    if out_name == in_name and rotation is None and in_name.startswith('cubemap'):
+        # Directions on a cube edge belong to two faces. The direct identity
+        # mapping keeps the pixel, the generic path may pick the other face.
+        directions, _ = settings.output_projection.to_directions(xs, ys)
+        assert on_cube_edge(directions[differs]).all()
+        assert np.allclose(direct_xs[direct_valid], xs[direct_valid] * (settings.in_width - 1))
+        assert np.allclose(direct_ys[direct_valid], ys[direct_valid] * (settings.in_height - 1))
+    else:
+        assert not differs.any()
+
+    if out_name == in_name == 'hemispherical' and rotation is None:
+        # On the first row and column, the generic round trip lands a
+        # rounding error outside of the image and is rejected, while the
+        # direct identity mapping keeps the pixel
+        only_direct = direct_valid & ~generic_valid
+        assert ((xs == 0) | (ys == 0))[only_direct].all()
+        directions, _ = settings.output_projection.to_directions(xs, ys)
+        points_x, points_y, _ = settings.input_projection.to_points(directions)
+        assert np.all(np.minimum(points_x, points_y)[only_direct] > -1e-12)
+        assert not (generic_valid & ~direct_valid).any()
+    else:
+        assert np.array_equal(direct_valid, generic_valid)
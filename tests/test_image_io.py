@@ -0,0 +1,33 @@
+import numpy as np
+import pytest
+
+from image_io import read_image, writable_channels, write_image
+
+
+@pytest.mark.parametrize('path,dtype,channels,written', [
+    ('out.jpg', np.uint8, 3, 3),
+    ('out.jpg', np.uint8, 4, 3),
+    ('out.png', np.uint8, 4, 4),
+    ('out.png', np.uint16, 1, 1),
+    ('out.tif', np.float32, 1, 1),
+    ('out.npy', np.float32, 3, 3),
+])
+def test_writable_channels(path, dtype, channels, written):
+    assert writable_channels(path, dtype, channels) == written
+
+
+@pytest.mark.parametrize('path,dtype,channels', [
+    ('out.jpg', np.uint16, 1),
+    ('out.jpg', np.float32, 3),
+    ('out.png', np.uint16, 3),
+    ('out.unknown', np.uint8, 3),
+])
+def test_unwritable_channels(path, dtype, channels):
+    with pytest.raises(ValueError):
+        writable_channels(path, dtype, channels)
+
+
+def test_jpeg_drops_alpha(tmp_path):
+    path = str(tmp_path / 'out.jpg')
+    write_image(path, np.full((8, 8, 4), 128, dtype=np.uint8))
+    assert read_image(path).shape == (8, 8, 3)
@@ -0,0 +1,17 @@
+import numpy as np
+
+from projector import Projector
+
+IN_WIDTH, IN_HEIGHT = 512, 256
+
+
+def test_bicubic_float_output_stays_within_input_range():
+    # Sharp edges of a non-negative HDR image make bicubic taps overshoot
+    rng = np.random.default_rng(0)
+    image = np.where(rng.random((IN_HEIGHT, IN_WIDTH, 3)) < 0.05, 1000.0, 0.0).astype(np.float32)
+    projector = Projector('cubemap', (IN_WIDTH, IN_HEIGHT), 'equirectangular', out_width=512, filter_name='bicubic')
+    output = projector.project(image)
+    assert output.min() >= 0
+    assert output.max() <= 1000
+    # Smooth regions are still interpolated
+    assert np.count_nonzero((output > 0) & (output < 1000)) > 0
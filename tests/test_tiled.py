@@ -0,0 +1,30 @@
+import numpy as np
+import pytest
+
+from projector import Projector
+from sampler import parse_rotation
+
+IN_WIDTH, IN_HEIGHT = 512, 256
+# Smaller than the output and not dividing it, so that there are partial tiles
+TILE_SIZE = 37
+
+
+@pytest.mark.parametrize('out_projection', ['cubemap', 'hemispherical', 'equirectangular'])
+@pytest.mark.parametrize('options', [
+    dict(),
+    dict(filter_name='bicubic', samples=2),
+    dict(filter_name='bilinear', samples=4, adaptive=True),
+])
+def test_tiled_output_equals_whole_output(out_projection, options):
+    image = np.random.default_rng(0).integers(0, 256, (IN_HEIGHT, IN_WIDTH, 3), dtype=np.uint8)
+    projector = Projector(
+        out_projection,
+        (IN_WIDTH, IN_HEIGHT),
+        'equirectangular',
+        out_width=160,
+        rotation=parse_rotation('10,20,30', None),
+        **options,
+    )
+    tiled = np.zeros_like(projector.project(image))
+    projector.project_tiled(image, tiled, TILE_SIZE)
+    assert np.array_equal(tiled, projector.project(image))
@@ -0,0 +1,52 @@
+from typing import Optional
+
+import numpy as np
+
+from lookup_table import AdaptiveLookupTable, LookupTable
+
+
+def render_tiled(
+    sampler,
+    input_buffer: np.ndarray,
+    output_buffer: np.ndarray,
+    tile_size: int,
+    filter_name: str = 'nearest',
+    samples: int = 1,
+    kernel: str = 'box',
+    adaptive: bool = False,
+):
+    # Render the output tile by tile. Per tile, only the lookup table of
+    # the tile is built and only the input region it refers to is read,
+    # so memory-mapped input and output buffers are never fully loaded.
+    out_height, out_width = output_buffer.shape[:2]
+    for y_start in range(0, out_height, tile_size):
+        for x_start in range(0, out_width, tile_size):
+            y_end = min(y_start + tile_size, out_height)
+            x_end = min(x_start + tile_size, out_width)
+            output_tile = output_buffer[y_start:y_end, x_start:x_end]
+
+            table_class = AdaptiveLookupTable if adaptive else LookupTable
+            lookup_table = table_class.build(
+                sampler,
+                filter_name,
+                samples,
+                kernel,
+                region=(x_start, y_start, x_end, y_end),
+            )
+            source_region = lookup_table.source_region()
+            if source_region is None:
+                # Tile lies entirely in a projection gap
+                output_tile[...] = 0
+                continue
+
+            source_x_start, source_y_start, source_x_end, source_y_end = source_region
+            input_tile = np.asarray(input_buffer[source_y_start:source_y_end, source_x_start:source_x_end])
+            lookup_table.cropped(source_region).apply(input_tile, out=output_tile)
+
+
+def open_output_buffer(path: Optional[str], shape, dtype) -> np.ndarray:
+    # Memory-mapped .npy output, written tile by tile, or an in-memory
+    # buffer for image formats which have to be encoded as a whole
+    if path and path.endswith('.npy'):
+        return np.lib.format.open_memmap(path, mode='w+', dtype=dtype, shape=shape)
+    return np.zeros(shape, dtype=dtype)